@@ -0,0 +1,218 @@
+"""Бэкенды кэша Yatube со счётчиками попаданий и промахов.
+
+Django создаёт экземпляр кэша на каждый поток, поэтому
+``cache.stats()`` — счётчики текущего потока (удобно мерить запрос),
+а ``process_stats()`` — суммы по всем потокам процесса.
+
+На ``add`` держатся блокировки пересчёта (``core.cache.stampede``)
+и поколения лент, поэтому он атомарен во всех бэкендах: у файлового
+в Django это ``has_key`` и ``set`` по отдельности, здесь запись
+появляется жёсткой ссылкой, которая не перезаписывает чужой файл.
+``delete_if_equal`` снимает блокировку, только если она всё ещё
+своя.
+"""
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+
+from django.core.cache.backends import filebased, locmem, memcached
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_MISSING = object()
+
+_lock = threading.Lock()
+_totals = Counter()
+
+
+def process_stats():
+    with _lock:
+        return dict(_totals)
+
+
+class StatsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_get_many = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _record(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        with _lock:
+            _totals['hits'] += hits
+            _totals['misses'] += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version=version)
+        found = value is not _MISSING
+        # базовый get_many вызывает get для каждого ключа
+        if not self._in_get_many:
+            self._record(int(found), int(not found))
+        return value if found else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        self._in_get_many = True
+        try:
+            values = super().get_many(keys, version=version)
+        finally:
+            self._in_get_many = False
+        self._record(len(values), len(keys) - len(values))
+        return values
+
+    def delete_if_equal(self, key, value, version=None):
+        """Удаляет запись, если в ней лежит ``value``.
+
+        Между чтением и удалением запись может смениться: бэкенды,
+        где это возможно, переопределяют метод атомарным.
+        """
+        if super().get(key, _MISSING, version=version) != value:
+            return False
+        self.delete(key, version=version)
+        return True
+
+
+class FileBasedCache(StatsMixin, filebased.FileBasedCache):
+    """Общий для всех процессов кэш в каталоге на диске.
+
+    Ключи с префиксами из ``OPTIONS['PINNED_PREFIXES']`` лежат
+    в подкаталоге ``pinned``: вытеснение (``_cull``) смотрит только
+    на файлы верхнего уровня и их не трогает, ``clear()`` удаляет.
+    """
+
+    pinned_dir = 'pinned'
+
+    def __init__(self, dir, params):
+        options = params.get('OPTIONS', {})
+        self._pinned_prefixes = tuple(options.get('PINNED_PREFIXES', ()))
+        super().__init__(dir, params)
+
+    def _pinned_path(self):
+        return os.path.join(self._dir, self.pinned_dir)
+
+    def _createdir(self):
+        super()._createdir()
+        if self._pinned_prefixes:
+            os.makedirs(self._pinned_path(), 0o700, exist_ok=True)
+
+    def _key_to_file(self, key, version=None):
+        fname = super()._key_to_file(key, version)
+        if not key.startswith(self._pinned_prefixes):
+            return fname
+        return os.path.join(self._pinned_path(), os.path.basename(fname))
+
+    def _cull(self):
+        if self._cull_frequency:
+            return super()._cull()
+        # базовый _cull при CULL_FREQUENCY = 0 вызывает clear(),
+        # а вытеснение не должно задевать закреплённые ключи
+        if len(self._list_cache_files()) >= self._max_entries:
+            super().clear()
+
+    def clear(self):
+        super().clear()
+        pinned = self._pinned_path()
+        if os.path.isdir(pinned):
+            for fname in os.listdir(pinned):
+                self._delete(os.path.join(pinned, fname))
+
+    def _read(self, fname):
+        """``(истекла ли, значение)`` файла записи, не удаляя его."""
+        with open(fname, 'rb') as file:
+            try:
+                expiry = pickle.load(file)
+                value = pickle.loads(zlib.decompress(file.read()))
+            except (EOFError, pickle.UnpicklingError, zlib.error):
+                return True, None
+        return expiry is not None and expiry < time.time(), value
+
+    def _read_if_exists(self, fname):
+        try:
+            return self._read(fname)
+        except FileNotFoundError:
+            return None, None
+
+    def _take(self, fname, condition):
+        """Забирает файл записи, если ``condition(expired, value)``.
+
+        Файл сначала атомарно переименовывается: проверку видит только
+        этот процесс. Не подошедший файл возвращается ссылкой, если его
+        место ещё никто не занял. Возвращает, забран ли файл.
+        """
+        taken = f'{fname}.{uuid.uuid4().hex}.taken'
+        try:
+            os.rename(fname, taken)
+        except FileNotFoundError:
+            return False
+        try:
+            if condition(*self._read(taken)):
+                return True
+            try:
+                os.link(taken, fname)
+            except FileExistsError:
+                pass
+            return False
+        finally:
+            os.remove(taken)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as file:
+                self._write_content(file, timeout, value)
+            while True:
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    pass
+                expired, _ = self._read_if_exists(fname)
+                if expired is False:
+                    return False
+                # истёкшую запись убирает один из претендентов
+                self._take(fname, lambda expired, value: expired)
+        finally:
+            os.remove(tmp_path)
+
+    def delete_if_equal(self, key, value, version=None):
+        return self._take(
+            self._key_to_file(key, version),
+            lambda expired, stored: stored == value,
+        )
+
+
+class LocMemCache(StatsMixin, locmem.LocMemCache):
+    """Кэш в памяти процесса, для разработки."""
+
+    def delete_if_equal(self, key, value, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            pickled = self._cache.get(key)
+            if pickled is None or pickle.loads(pickled) != value:
+                return False
+            self._delete(key)
+        return True
+
+
+class MemcachedCache(StatsMixin, memcached.MemcachedCache):
+    """Memcached по сокету, нужен пакет python-memcached.
+
+    ``add`` у memcached атомарен; ``delete_if_equal`` — чтение
+    и удаление, между ними блокировка может истечь и смениться.
+    """
@@ -0,0 +1,151 @@
+"""Кэширование с защитой от одновременного пересчёта.
+
+Запись хранит значение, версию данных, из которых оно посчитано,
+срок свежести и время расчёта. Свежую запись просто отдают. Устаревшую
+(истёк срок или сменилась версия) пересчитывает тот, кто первым взял
+блокировку, а остальные тем временем отдают старое значение. Поэтому
+запись лежит в кэше дольше срока свежести на ``stale`` секунд —
+столько после истечения её ещё можно показывать.
+
+Блокировку берут через ``cache.add``, поэтому бэкенду нужен атомарный
+``add`` (memcached, ``core.cache.backends``). В блокировке лежит
+случайная метка, и снимается она через ``delete_if_equal`` — только
+если её не перехватил другой запрос.
+
+Версия, если задана, — время поколения данных. Значение, прочитанное
+из реплики, которая может ещё не содержать эту версию
+(``core.db.routers.synced_as_of``), отдают, но не сохраняют: иначе
+старые данные остались бы в кэше под новой версией.
+
+Чтобы срок не истекал у всех разом, запись пересчитывается заранее
+с вероятностью, растущей к концу срока (XFetch, Vattani и др.):
+запрос считает её устаревшей, если
+``now - delta * beta * log(random()) >= expires``, где ``delta`` —
+сколько длился прошлый расчёт. Дорогие значения обновляются раньше.
+
+Счётчики исходов ведутся по потоку (``stats()``, удобно мерить
+запрос) и по процессу (``process_stats()``):
+
+* ``fresh`` — отдано свежее значение;
+* ``early`` — пересчитано заранее, до истечения срока;
+* ``recomputed`` — пересчитано устаревшее или отсутствующее;
+* ``stale`` — отдано устаревшее, пока пересчитывает другой запрос:
+  пересчёт, которого удалось избежать;
+* ``uncached`` — блокировка занята, а показать нечего: посчитано
+  без записи.
+"""
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from core.db import routers
+
+# записи без delta остались от версии без XFetch
+Entry = namedtuple(
+    'Entry', 'value version expires delta', defaults=(0.0,)
+)
+
+LOCK_KEY = '{}:lock'
+
+OUTCOMES = ('fresh', 'early', 'recomputed', 'stale', 'uncached')
+
+_lock = threading.Lock()
+_totals = Counter()
+_local = threading.local()
+
+
+def _count(outcome):
+    counter = getattr(_local, 'counter', None)
+    if counter is None:
+        counter = _local.counter = Counter()
+    counter[outcome] += 1
+    with _lock:
+        _totals[outcome] += 1
+
+
+def stats():
+    """Счётчики исходов текущего потока."""
+    counter = getattr(_local, 'counter', Counter())
+    return {outcome: counter[outcome] for outcome in OUTCOMES}
+
+
+def process_stats():
+    with _lock:
+        return {outcome: _totals[outcome] for outcome in OUTCOMES}
+
+
+def reset_stats():
+    _local.counter = Counter()
+
+
+def expires_early(entry, beta, now=None):
+    """Решает, пересчитать ли ещё свежую запись заранее."""
+    now = time.time() if now is None else now
+    # 1 - random() лежит в (0, 1]: логарифм нуля не возьмётся
+    return now - entry.delta * beta * math.log(
+        1 - random.random()
+    ) >= entry.expires
+
+
+def _replica_has(version):
+    """Читаемая база уже содержит данные версии ``version``."""
+    return version is None or version <= routers.synced_as_of()
+
+
+def get_or_set(key, compute, version=None, timeout=300, stale=None,
+               lock_timeout=None, beta=None, cacheable=None, cache=None):
+    """Значение по ключу; ``compute()`` считает его при промахе.
+
+    Возвращает пару ``(value, fresh)``: ``fresh`` ложно, если отдано
+    устаревшее значение, пока его пересчитывает другой запрос.
+    ``cacheable(value)`` может запретить запись значения. Умолчания
+    ``stale``, ``lock_timeout`` и ``beta`` берутся из настроек
+    ``STAMPEDE_*``.
+    """
+    cache = cache or default_cache
+    stale = settings.STAMPEDE_STALE if stale is None else stale
+    beta = settings.STAMPEDE_BETA if beta is None else beta
+    entry = cache.get(key)
+    valid = (
+        entry is not None and entry.version == version
+        and entry.expires > time.time()
+    )
+    if valid and not expires_early(entry, beta):
+        _count('fresh')
+        return entry.value, True
+    lock = LOCK_KEY.format(key)
+    # в блокировке — метка владельца: если пересчёт затянулся дольше
+    # блокировки и её взял другой, снимать чужую нельзя
+    token = uuid.uuid4().hex
+    if not cache.add(lock, token, lock_timeout or settings.STAMPEDE_LOCK):
+        if valid:
+            # заранее уже пересчитывает другой, а эта запись свежая
+            _count('fresh')
+            return entry.value, True
+        if entry is not None:
+            _count('stale')
+            return entry.value, False
+        _count('uncached')
+        return compute(), True
+    try:
+        started = time.perf_counter()
+        value = compute()
+        delta = time.perf_counter() - started
+        if (
+            (cacheable is None or cacheable(value))
+            and _replica_has(version)
+        ):
+            cache.set(
+                key, Entry(value, version, time.time() + timeout, delta),
+                timeout + stale,
+            )
+    finally:
+        cache.delete_if_equal(lock, token)
+    _count('early' if valid else 'recomputed')
+    return value, True
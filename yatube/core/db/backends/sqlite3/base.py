@@ -0,0 +1,41 @@
+"""SQLite для нескольких воркеров.
+
+Стандартный бэкенд Django 2.2 плюс две настройки ``OPTIONS``
+из Django 5.1, чтобы при обновлении осталось только сменить ENGINE:
+
+* ``init_command`` — SQL, который выполняется на каждом новом
+  соединении: здесь включаются WAL, ``synchronous=NORMAL``,
+  ``busy_timeout`` и ``mmap_size``;
+* ``transaction_mode`` — как начинать транзакции ``atomic``.
+  С ``IMMEDIATE`` блокировка записи берётся сразу, и конкурент ждёт
+  её ``busy_timeout``. С обычным ``BEGIN`` транзакция, которая
+  сначала читала, а потом пишет, получает «database is locked»
+  без ожидания, если кто-то успел записать раньше.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_command = params.pop('init_command', '')
+        mode = params.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        self.transaction_mode = mode and mode.upper()
+        return params
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        if self.init_command:
+            self.connection.executescript(self.init_command)
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,103 @@
+"""Чтение из реплик базы с гарантией «видно своё».
+
+Запросы view, помеченных ``replica_reads``, читают из случайной
+реплики из ``DATABASE_REPLICAS``; всё остальное, включая любые
+записи, идёт в основную базу. Реплика может отставать, поэтому
+``core.middleware.ReplicaMiddleware`` после записи ставит cookie, и
+``REPLICA_PIN_SECONDS`` секунд этот браузер читает только из основной
+базы — пользователь сразу видит свой пост или комментарий. После
+первой записи и до конца запроса чтение тоже идёт из основной базы.
+Сессии всегда читаются из основной базы: иначе только что вошедший
+пользователь мог бы оказаться анонимом.
+
+Отстающая реплика не должна попадать в кэш под новым поколением
+ленты: ``synced_as_of()`` говорит, с какого момента записи могут
+ещё не дойти до читаемой базы. ``manage.py sync_replica`` отмечает
+начало каждого копирования; у реплик серверной базы отметок нет, и
+прочитанное из них не кэшируется вовсе.
+"""
+import math
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+PIN_COOKIE = 'primary_until'
+PRIMARY_APPS = ('sessions',)
+SYNCED_KEY = 'replica-synced:{}'
+
+_state = threading.local()
+
+
+def pinned(request):
+    """Браузер недавно писал и читает из основной базы."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def reset_writes():
+    _state.wrote = False
+
+
+def has_written():
+    """Была ли запись в базу с последнего ``reset_writes()``."""
+    return getattr(_state, 'wrote', False)
+
+
+def mark_synced(alias, moment):
+    """В реплике ``alias`` есть все записи, сделанные до ``moment``."""
+    cache.set(SYNCED_KEY.format(alias), moment, None)
+
+
+def synced_as_of():
+    """Момент, до которого читаемая сейчас база содержит все записи."""
+    replica = getattr(_state, 'replica', None)
+    if replica is None or has_written():
+        return math.inf
+    return cache.get(SYNCED_KEY.format(replica), 0)
+
+
+def replica_reads(view):
+    """Чтения view уходят в реплику, если браузер не «приколот»."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in ('GET', 'HEAD')
+            or pinned(request)
+        ):
+            return view(request, *args, **kwargs)
+        previous = getattr(_state, 'replica', None)
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = previous
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if has_written() or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return getattr(_state, 'replica', None)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — копии основной базы, объекты из них связываются
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # схема приходит в реплики вместе с данными
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import perfstats
+
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def _format(value):
+    if value is None:
+        return '-'
+    if value == float('inf'):
+        return f'>{perfstats.TIME_BUCKETS[-1]}'
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает статистику производительности по view: '
+        'время ответа, SQL, шаблоны и кэш. early — пересчёты кэша '
+        'заранее, stale — запросы, получившие устаревшее значение '
+        'вместо одновременного пересчёта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true',
+            help='вывести накопленные гистограммы как есть',
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='обнулить статистику после вывода',
+        )
+        parser.add_argument(
+            '--sort', default='requests',
+            choices=('requests', 'wall_ms', 'db_ms', 'queries'),
+            help='по какому столбцу сортировать (сумма за все запросы)',
+        )
+
+    def handle(self, *args, **options):
+        stats = perfstats.read()
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2, sort_keys=True))
+        else:
+            self.write_table(stats, options['sort'])
+        if options['reset']:
+            perfstats.reset()
+
+    def write_table(self, stats, sort):
+        if not stats:
+            self.stdout.write('Статистики пока нет')
+            return
+
+        def total(item):
+            value = item[1][sort]
+            return value['sum'] if isinstance(value, dict) else value
+
+        self.stdout.write(
+            f'{"view":<28} {"n":>7} {"avg ms":>8} {"p50":>6} {"p95":>6} '
+            f'{"p99":>6} {"sql":>5} {"sql ms":>7} {"tpl ms":>7} '
+            f'{"cache hit":>9} {"early":>6} {"stale":>6}'
+        )
+        for view, data in sorted(stats.items(), key=total, reverse=True):
+            requests = data['requests'] or 1
+            wall = data['wall_ms']
+            p50, p95, p99 = (
+                _format(perfstats.percentile(
+                    wall, perfstats.TIME_BUCKETS, fraction
+                ))
+                for fraction in PERCENTILES
+            )
+            lookups = data['cache_hits'] + data['cache_misses']
+            hit_rate = (
+                f'{data["cache_hits"] / lookups:.0%}' if lookups else '-'
+            )
+            self.stdout.write(
+                f'{view:<28} {data["requests"]:>7} '
+                f'{wall["sum"] / requests:>8.1f} {p50:>6} {p95:>6} '
+                f'{p99:>6} {data["queries"]["sum"] / requests:>5.1f} '
+                f'{data["db_ms"]["sum"] / requests:>7.1f} '
+                f'{data["template_ms"]["sum"] / requests:>7.1f} '
+                f'{hit_rate:>9} {data.get("stampede_early", 0):>6} '
+                f'{data.get("stampede_stale", 0):>6}'
+            )
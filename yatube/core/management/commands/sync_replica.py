@@ -0,0 +1,55 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db import routers
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из '
+        'DATABASE_REPLICAS онлайн-бэкапом SQLite: основная база '
+        'во время копирования продолжает работать.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='повторять каждые столько секунд, пока не прервут',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены (DATABASE_REPLICAS)')
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError(
+                'Реплики серверной базы обновляет сама база'
+            )
+        while True:
+            started = time.monotonic()
+            for alias in settings.DATABASE_REPLICAS:
+                self.sync(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f'Реплики обновлены за {time.monotonic() - started:.2f} с'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def sync(self, alias):
+        # всё, что закоммичено до начала копирования, попадёт в снимок
+        started = time.time()
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+        try:
+            # страницы копируются пачками, между ними основная база
+            # свободна для записи; если она изменилась, копирование
+            # начинается заново и заканчивается согласованным снимком
+            source.backup(target, pages=1024)
+        finally:
+            target.close()
+            source.close()
+        routers.mark_synced(alias, started)
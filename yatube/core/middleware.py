@@ -0,0 +1,97 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import perfstats
+from core.cache import stampede
+from core.db import routers
+
+
+class PerfStatsMiddleware:
+    """Замеряет запросы и копит статистику по view.
+
+    При выключенной ``PERFSTATS_ENABLED`` Django убирает middleware
+    из цепочки, и на запросы она не тратит ничего.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFSTATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        perfstats.instrument_templates()
+
+    def __call__(self, request):
+        sample = perfstats.Sample()
+        cache_before = self._cache_stats()
+        stampede_before = stampede.stats()
+        perfstats.set_sample(sample)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(sample.db_wrapper)
+                    )
+                response = self.get_response(request)
+        finally:
+            perfstats.set_sample(None)
+        wall = time.perf_counter() - sample.started
+        cache_after = self._cache_stats()
+        hits = cache_after['hits'] - cache_before['hits']
+        misses = cache_after['misses'] - cache_before['misses']
+        stampede_after = stampede.stats()
+        early = stampede_after['early'] - stampede_before['early']
+        stale = stampede_after['stale'] - stampede_before['stale']
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        perfstats.recorder.record(
+            view, sample, wall, hits, misses, early, stale
+        )
+        if settings.PERFSTATS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'app;dur={wall * 1000:.1f}',
+                f'db;dur={sample.db_time * 1000:.1f};'
+                f'desc="{sample.queries} queries"',
+                f'tpl;dur={sample.template_time * 1000:.1f}',
+                f'cache;desc="{hits} hits, {misses} misses, '
+                f'{early} early, {stale} stale"',
+            ))
+        return response
+
+    @staticmethod
+    def _cache_stats():
+        # у стандартных бэкендов Django счётчиков нет
+        stats = getattr(cache, 'stats', None)
+        return stats() if stats else {'hits': 0, 'misses': 0}
+
+
+class ReplicaMiddleware:
+    """Ставит cookie «читать из основной базы» после записи в неё.
+
+    Без реплик (``DATABASE_REPLICAS`` пуст) Django убирает middleware
+    из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset_writes()
+        try:
+            response = self.get_response(request)
+            wrote = routers.has_written()
+        finally:
+            routers.reset_writes()
+        if wrote:
+            pin = settings.REPLICA_PIN_SECONDS
+            response.set_cookie(
+                routers.PIN_COOKIE, f'{time.time() + pin:.0f}',
+                max_age=pin, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,228 @@
+"""Статистика производительности по view.
+
+Для каждого view (``resolver_match.view_name``) копятся гистограммы
+времени ответа, числа и времени SQL-запросов, времени рендера шаблонов
+и счётчики кэша: попаданий, промахов, пересчётов заранее и отданных
+устаревшими значений (``core.cache.stampede``). Процесс копит их
+в памяти и время от времени сливает в общий JSON-файл
+``PERFSTATS_FILE`` под файловой блокировкой, так что
+``manage.py perfstats`` видит сумму по всем воркерам.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.backends import django as django_backend
+
+try:
+    import fcntl
+except ImportError:  # Windows: файл пишется без блокировки
+    fcntl = None
+
+# Верхние границы корзин: миллисекунды для времени, штуки для запросов
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = {
+    'wall_ms': TIME_BUCKETS,
+    'db_ms': TIME_BUCKETS,
+    'template_ms': TIME_BUCKETS,
+    'queries': COUNT_BUCKETS,
+}
+COUNTERS = (
+    'cache_hits', 'cache_misses', 'stampede_early', 'stampede_stale',
+)
+
+
+def bucket(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def empty_view():
+    return {
+        'requests': 0,
+        **{name: 0 for name in COUNTERS},
+        **{
+            name: {'buckets': [0] * (len(bounds) + 1), 'sum': 0}
+            for name, bounds in HISTOGRAMS.items()
+        },
+    }
+
+
+def merge(target, source):
+    """Прибавляет статистику ``source`` к ``target`` (по view)."""
+    for view, stats in source.items():
+        into = target.setdefault(view, empty_view())
+        into['requests'] += stats['requests']
+        for name in COUNTERS:
+            # в файлах прошлых версий новых счётчиков нет
+            into[name] = into.get(name, 0) + stats.get(name, 0)
+        for name in HISTOGRAMS:
+            into[name]['sum'] += stats[name]['sum']
+            into[name]['buckets'] = [
+                a + b for a, b in zip(
+                    into[name]['buckets'], stats[name]['buckets']
+                )
+            ]
+    return target
+
+
+def percentile(histogram, bounds, fraction):
+    """Оценка перцентиля сверху: граница корзины, где он лежит."""
+    total = sum(histogram['buckets'])
+    if not total:
+        return None
+    seen = 0
+    for index, count in enumerate(histogram['buckets']):
+        seen += count
+        if seen >= total * fraction:
+            return bounds[index] if index < len(bounds) else float('inf')
+
+
+class Sample:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    @contextmanager
+    def template(self):
+        # вложенный render не должен считаться дважды
+        self._template_depth += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._template_depth -= 1
+            if not self._template_depth:
+                self.template_time += time.perf_counter() - started
+
+
+_local = threading.local()
+
+
+def current_sample():
+    return getattr(_local, 'sample', None)
+
+
+def set_sample(sample):
+    _local.sample = sample
+
+
+_original_render = django_backend.Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    sample = current_sample()
+    if sample is None:
+        return _original_render(self, context, request)
+    with sample.template():
+        return _original_render(self, context, request)
+
+
+def instrument_templates():
+    """Подменяет ``Template.render`` бэкенда Django замеряющей версией."""
+    django_backend.Template.render = _timed_render
+
+
+class Recorder:
+    """Статистика процесса с периодическим сбросом в файл."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._flushed = time.monotonic()
+
+    def record(self, view, sample, wall, cache_hits=0, cache_misses=0,
+               stampede_early=0, stampede_stale=0):
+        values = {
+            'wall_ms': wall * 1000,
+            'db_ms': sample.db_time * 1000,
+            'template_ms': sample.template_time * 1000,
+            'queries': sample.queries,
+        }
+        with self._lock:
+            stats = self._stats.setdefault(view, empty_view())
+            stats['requests'] += 1
+            stats['cache_hits'] += cache_hits
+            stats['cache_misses'] += cache_misses
+            stats['stampede_early'] += stampede_early
+            stats['stampede_stale'] += stampede_stale
+            for name, value in values.items():
+                histogram = stats[name]
+                histogram['sum'] += value
+                histogram['buckets'][bucket(HISTOGRAMS[name], value)] += 1
+            due = (
+                time.monotonic() - self._flushed
+                >= settings.PERFSTATS_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return merge({}, self._stats)
+
+    def flush(self):
+        """Сливает накопленное в ``PERFSTATS_FILE`` и обнуляет память."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            self._flushed = time.monotonic()
+        if stats:
+            with locked_file() as stored:
+                merge(stored, stats)
+
+
+@contextmanager
+def locked_file(path=None):
+    """Содержимое файла статистики; изменения записываются на выходе."""
+    path = path or settings.PERFSTATS_FILE
+    with open(f'{path}.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            stored = read(path)
+            yield stored
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as file:
+                json.dump(stored, file)
+            os.replace(temporary, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read(path=None):
+    try:
+        with open(path or settings.PERFSTATS_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def reset(path=None):
+    with locked_file(path) as stored:
+        stored.clear()
+
+
+recorder = Recorder()
+atexit.register(recorder.flush)
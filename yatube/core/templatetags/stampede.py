@@ -0,0 +1,56 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core.cache import stampede
+
+register = template.Library()
+
+
+class StampedeCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'stampede_cache: неверный срок {self.timeout.token!r}'
+            )
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on]
+        )
+        version = self.version.resolve(context) if self.version else None
+        value, _ = stampede.get_or_set(
+            key, lambda: self.nodelist.render(context),
+            version=version, timeout=timeout,
+        )
+        return value
+
+
+@register.tag
+def stampede_cache(parser, token):
+    """Как ``{% cache %}``, но без одновременного пересчёта.
+
+    ``{% stampede_cache срок имя [ключи...] [version=выражение] %}``.
+    Смена ``version`` делает фрагмент устаревшим: его пересчитывает
+    один запрос, остальные пока получают старый.
+    """
+    nodelist = parser.parse(('endstampede_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    version = None
+    if len(bits) > 3 and bits[-1].startswith('version='):
+        version = parser.compile_filter(bits.pop()[len('version='):])
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]}: нужны срок и имя фрагмента'
+        )
+    return StampedeCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]], version,
+    )
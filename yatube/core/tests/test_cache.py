@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache.backends import FileBasedCache, LocMemCache, process_stats
+
+
+class FileBasedCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def make_cache(self, **params):
+        return FileBasedCache(self.location, params)
+
+    def test_shared_between_instances(self):
+        """Запись одного воркера видна другому"""
+        first, second = self.make_cache(), self.make_cache()
+        first.set('page', 'content')
+        self.assertEqual(second.get('page'), 'content')
+
+    def test_prefix_and_version(self):
+        """Префикс и версия разделяют ключи"""
+        cache = self.make_cache(KEY_PREFIX='a', VERSION=1)
+        cache.set('key', 'a1')
+        self.assertIsNone(self.make_cache(KEY_PREFIX='b').get('key'))
+        self.assertIsNone(
+            self.make_cache(KEY_PREFIX='a', VERSION=2).get('key')
+        )
+        self.assertEqual(cache.get('key', version=1), 'a1')
+
+    def test_add_is_atomic(self):
+        """Из одновременных add на один ключ удаётся ровно один"""
+        barrier = threading.Barrier(8)
+        added = []
+
+        def add(number):
+            cache = self.make_cache()
+            barrier.wait()
+            added.append(cache.add('lock', number, 30))
+
+        threads = [
+            threading.Thread(target=add, args=(number,))
+            for number in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(added.count(True), 1)
+        self.assertFalse(self.make_cache().add('lock', 'late', 30))
+
+    def test_add_replaces_expired(self):
+        cache = self.make_cache()
+        cache.add('lock', 'old', 10)
+        with mock.patch('time.time', return_value=10 ** 10):
+            self.assertTrue(cache.add('lock', 'new', 10))
+            self.assertEqual(cache.get('lock'), 'new')
+
+    def test_delete_if_equal(self):
+        """Запись удаляется, только если значение совпало"""
+        cache = self.make_cache()
+        cache.set('lock', 'mine')
+        self.assertFalse(cache.delete_if_equal('lock', 'other'))
+        self.assertEqual(cache.get('lock'), 'mine')
+        self.assertTrue(cache.delete_if_equal('lock', 'mine'))
+        self.assertIsNone(cache.get('lock'))
+        self.assertFalse(cache.delete_if_equal('lock', 'mine'))
+
+    def test_pinned_keys_are_not_culled(self):
+        cache = self.make_cache(OPTIONS={
+            'MAX_ENTRIES': 3,
+            'CULL_FREQUENCY': 0,
+            'PINNED_PREFIXES': ['generation:'],
+        })
+        cache.set('generation:index', 1)
+        for number in range(10):
+            cache.set(f'page:{number}', number)
+        self.assertEqual(cache.get('generation:index'), 1)
+        self.assertTrue(cache.add('generation:group', 2))
+        self.assertFalse(cache.add('generation:group', 3))
+        cache.clear()
+        self.assertIsNone(cache.get('generation:index'))
+        self.assertIsNone(cache.get('generation:group'))
+
+
+class CacheStatsTest(SimpleTestCase):
+    def test_hits_and_misses(self):
+        cache = LocMemCache('stats-test', {})
+        totals = process_stats()
+        cache.set('stored', 0)
+        cache.get('stored')
+        cache.get('missing', 'default')
+        cache.get_many(['stored', 'missing'])
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2})
+        self.assertEqual(
+            process_stats()['hits'] - totals.get('hits', 0), 2
+        )
+        cache.reset_stats()
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0})
+
+    def test_locmem_delete_if_equal(self):
+        cache = LocMemCache('delete-if-equal-test', {})
+        cache.set('lock', 'mine')
+        self.assertFalse(cache.delete_if_equal('lock', 'other'))
+        self.assertTrue(cache.delete_if_equal('lock', 'mine'))
+        self.assertIsNone(cache.get('lock'))
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.test import SimpleTestCase
+
+ALIAS = 'concurrency'
+
+
+class SQLiteConcurrencyTest(SimpleTestCase):
+    """Параллельные записи в файл SQLite с настройками сайта"""
+    THREADS = 8
+    WRITES = 25
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases[ALIAS] = {
+            **settings.DATABASES['default'],
+            'NAME': os.path.join(directory, 'concurrency.sqlite3'),
+            'CONN_MAX_AGE': 0,
+        }
+        connections.ensure_defaults(ALIAS)
+        self.addCleanup(connections.databases.pop, ALIAS)
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (value integer)')
+            cursor.execute('INSERT INTO counter VALUES (0)')
+            cursor.execute('PRAGMA journal_mode')
+            self.journal_mode = cursor.fetchone()[0]
+        connections[ALIAS].close()
+
+    def increment(self, errors):
+        connection = connections[ALIAS]
+        try:
+            for _ in range(self.WRITES):
+                # чтение, а затем запись в одной транзакции: с обычным
+                # BEGIN так падает с «database is locked»
+                with transaction.atomic(using=ALIAS):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT value FROM counter')
+                        value = cursor.fetchone()[0]
+                        cursor.execute(
+                            'UPDATE counter SET value = %s', [value + 1]
+                        )
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_parallel_writes(self):
+        """Писатели ждут друг друга, записи не теряются"""
+        self.assertEqual(self.journal_mode, 'wal')
+        errors = []
+        threads = [
+            threading.Thread(target=self.increment, args=(errors,))
+            for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with connections[ALIAS].cursor() as cursor:
+            cursor.execute('SELECT value FROM counter')
+            self.assertEqual(
+                cursor.fetchone()[0], self.THREADS * self.WRITES
+            )
+        connections[ALIAS].close()
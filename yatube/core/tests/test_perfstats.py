@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import perfstats
+from core.middleware import PerfStatsMiddleware
+
+TEMP_DIR = tempfile.mkdtemp()
+STATS_FILE = os.path.join(TEMP_DIR, 'perfstats.json')
+
+
+@override_settings(
+    PERFSTATS_ENABLED=True,
+    PERFSTATS_FILE=STATS_FILE,
+    PERFSTATS_SERVER_TIMING=True,
+    PERFSTATS_FLUSH_INTERVAL=3600,
+)
+class PerfStatsMiddlewareTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        perfstats.recorder.flush()
+        perfstats.reset()
+
+    def tearDown(self):
+        # остаток в памяти atexit слил бы в настоящий PERFSTATS_FILE
+        perfstats.recorder.flush()
+
+    def test_records_view_stats(self):
+        """Запрос попадает в статистику своего view"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        stats = perfstats.recorder.snapshot()['posts:index']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries']['sum'], 0)
+        self.assertGreater(stats['template_ms']['sum'], 0)
+        self.assertGreater(stats['cache_misses'], 0)
+
+    def test_flush_and_command(self):
+        """Статистика сливается в файл и показывается командой"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        perfstats.recorder.flush()
+        self.assertEqual(perfstats.read()['posts:index']['requests'], 2)
+        out = StringIO()
+        call_command('perfstats', reset=True, stdout=out)
+        self.assertIn('posts:index', out.getvalue())
+        self.assertEqual(perfstats.read(), {})
+
+    @override_settings(PERFSTATS_ENABLED=False)
+    def test_disabled(self):
+        """Выключенная middleware не попадает в цепочку"""
+        with self.assertRaises(MiddlewareNotUsed):
+            PerfStatsMiddleware(lambda request: None)
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import warnings
+from io import StringIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.cache import stampede
+from core.db import routers
+from core.middleware import ReplicaMiddleware
+from posts.conditional import page_conditional
+from posts.models import Post
+
+GENERATION = 1000.0
+
+
+@routers.replica_reads
+def read_view(request, write=False):
+    if write:
+        router.db_for_write(Post)
+    return HttpResponse(
+        f'{router.db_for_read(Post)} {router.db_for_read(Session)}'
+    )
+
+
+@routers.replica_reads
+@page_conditional(lambda request: GENERATION)
+def cached_view(request):
+    value, _ = stampede.get_or_set(
+        'replica-test', lambda: 'value', version=GENERATION
+    )
+    return HttpResponse(value)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware(
+            lambda request: read_view(request, **request.view_kwargs)
+        )
+
+    def get(self, method='get', write=False, **cookies):
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies)
+        request.view_kwargs = {'write': write}
+        return self.middleware(request)
+
+    def test_reads_from_replica(self):
+        """GET читает из реплики, сессии — из основной базы"""
+        response = self.get()
+        self.assertEqual(response.content, b'replica1 default')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_writes_pin_to_primary(self):
+        """После записи запрос и браузер читают из основной базы"""
+        response = self.get(write=True)
+        self.assertEqual(response.content, b'default default')
+        pin = response.cookies[routers.PIN_COOKIE].value
+        self.assertEqual(
+            self.get(**{routers.PIN_COOKIE: pin}).content,
+            b'default default',
+        )
+        expired = str(time.time() - 1)
+        self.assertEqual(
+            self.get(**{routers.PIN_COOKIE: expired}).content,
+            b'replica1 default',
+        )
+
+    def test_unsafe_methods_use_primary(self):
+        self.assertEqual(self.get('post').content, b'default default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # счётчик записей сбрасывает ReplicaMiddleware в начале запроса
+        routers.reset_writes()
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_lagging_replica_is_not_cached(self):
+        """Реплика без новой версии не наполняет кэш и не даёт ETag"""
+        routers.mark_synced('replica1', GENERATION - 1)
+        response = cached_view(self.request)
+        self.assertEqual(response.content, b'value')
+        self.assertIsNone(cache.get('replica-test'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_synced_replica_is_cached(self):
+        routers.mark_synced('replica1', GENERATION + 1)
+        response = cached_view(self.request)
+        self.assertEqual(cache.get('replica-test').value, 'value')
+        self.assertTrue(response.has_header('ETag'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_primary_is_cached(self):
+        cached_view(self.request)
+        self.assertEqual(cache.get('replica-test').value, 'value')
+
+
+class SyncReplicaTest(SimpleTestCase):
+    def test_copies_primary(self):
+        """sync_replica копирует основную базу в файл реплики"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        primary = os.path.join(directory, 'primary.sqlite3')
+        replica = os.path.join(directory, 'replica.sqlite3')
+        with sqlite3.connect(primary) as connection:
+            connection.execute('CREATE TABLE post (text text)')
+            connection.execute("INSERT INTO post VALUES ('пост')")
+        connection.close()
+        databases = {
+            'default': {'NAME': primary},
+            'replica1': {'NAME': replica},
+        }
+        # команда читает только пути файлов, соединения не меняются
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with override_settings(
+                DATABASES=databases, DATABASE_REPLICAS=['replica1']
+            ):
+                started = time.time()
+                call_command('sync_replica', stdout=StringIO())
+        self.addCleanup(cache.delete, routers.SYNCED_KEY.format('replica1'))
+        self.assertGreaterEqual(
+            cache.get(routers.SYNCED_KEY.format('replica1')), started
+        )
+        connection = sqlite3.connect(replica)
+        self.addCleanup(connection.close)
+        self.assertEqual(
+            connection.execute('SELECT text FROM post').fetchall(),
+            [('пост',)],
+        )
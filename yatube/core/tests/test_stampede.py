@@ -0,0 +1,110 @@
+import time
+from unittest import mock
+
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import stampede
+from core.cache.backends import LocMemCache
+
+
+class StampedeTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('stampede-test', {})
+        self.cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def get(self, version=None, **kwargs):
+        return stampede.get_or_set(
+            'key', self.compute, version=version, cache=self.cache,
+            **kwargs
+        )
+
+    def test_fresh_value_is_reused(self):
+        """Свежее значение не пересчитывается"""
+        self.assertEqual(self.get(), (1, True))
+        self.assertEqual(self.get(), (1, True))
+        self.assertEqual(self.calls, 1)
+
+    def test_new_version_recomputes(self):
+        """Смена версии делает запись устаревшей"""
+        self.get(version=1)
+        self.assertEqual(self.get(version=2), (2, True))
+        self.assertEqual(self.get(version=2), (2, True))
+
+    def test_expired_value_recomputes(self):
+        """После срока свежести значение пересчитывается"""
+        self.get(timeout=10)
+        with mock.patch('time.time', return_value=10 ** 10):
+            self.assertEqual(self.get(timeout=10), (2, True))
+
+    def test_foreign_lock_survives(self):
+        """Затянувшийся пересчёт не снимает блокировку следующего"""
+        lock = stampede.LOCK_KEY.format('key')
+
+        def slow():
+            # своя блокировка истекла, её взял другой запрос
+            self.cache.set(lock, 'other')
+            return 1
+
+        stampede.get_or_set('key', slow, cache=self.cache)
+        self.assertEqual(self.cache.get(lock), 'other')
+        self.get()
+        self.assertEqual(self.cache.get(lock), 'other')
+
+    def test_stale_value_while_locked(self):
+        """Пока пересчитывает другой, отдаётся старое значение"""
+        self.get(version=1)
+        self.cache.add(stampede.LOCK_KEY.format('key'), True)
+        stampede.reset_stats()
+        self.assertEqual(self.get(version=2), (1, False))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(stampede.stats()['stale'], 1)
+
+    def put_slow_entry(self):
+        # считался 100 секунд, а свежим остаётся ещё 10
+        self.cache.set('key', stampede.Entry(0, None, time.time() + 10, 100))
+
+    def test_early_recompute(self):
+        """Дорогое значение пересчитывается заранее, до срока"""
+        self.put_slow_entry()
+        stampede.reset_stats()
+        with mock.patch('random.random', return_value=0.0):
+            self.assertEqual(self.get(timeout=10), (0, True))
+        with mock.patch('random.random', return_value=0.5):
+            self.assertEqual(self.get(timeout=10), (1, True))
+        self.assertEqual(stampede.stats()['early'], 1)
+
+    def test_early_recompute_in_progress(self):
+        """Пока другой пересчитывает заранее, отдаётся свежее значение"""
+        self.put_slow_entry()
+        self.cache.add(stampede.LOCK_KEY.format('key'), True)
+        with mock.patch('random.random', return_value=0.5):
+            self.assertEqual(self.get(timeout=10), (0, True))
+        self.assertEqual(self.calls, 0)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'core.cache.backends.LocMemCache',
+    'LOCATION': 'stampede-tag-test',
+}})
+class StampedeCacheTagTest(SimpleTestCase):
+    TEMPLATE = Template(
+        '{% load stampede %}'
+        '{% stampede_cache 60 fragment key version=version %}'
+        '{{ value }}{% endstampede_cache %}'
+    )
+
+    def render(self, **context):
+        return self.TEMPLATE.render(Context({'key': 'a', **context}))
+
+    def test_fragment_versions(self):
+        """Фрагмент кэшируется до смены версии"""
+        self.assertEqual(self.render(value=1, version=1), '1')
+        self.assertEqual(self.render(value=2, version=1), '1')
+        self.assertEqual(self.render(value=2, key='b', version=1), '2')
+        self.assertEqual(self.render(value=3, version=2), '3')
@@ -14,4 +14,4 @@ def permission_denied(request, exception):
 
 
 def csrf_failure(request, reason=''):
-    return render(request, 'core/403csrf.html')
+    return render(request, 'core/403csrf.html', status=403)
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Group, Post, Comment, Follow
+from . import search
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -29,6 +30,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по индексу, а не LIKE по всей таблице
+        if not search_term:
+            return queryset, False
+        return search.get_backend().filter(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = (
@@ -0,0 +1,219 @@
+"""JSON API лент, постов и комментариев.
+
+Ответы собираются словарями, без форм и шаблонов, и листаются
+курсором (``?cursor=``, размер страницы — ``?limit=``). ETag
+и Last-Modified берутся из поколений ``feed_cache``: пока лента
+не менялась, повторный запрос получает ``304 Not Modified``,
+не трогая таблицу постов.
+
+Менять через API можно только подписки — пачкой, ``follow_authors``.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods, require_safe
+
+from core.db.routers import replica_reads
+from posts import feed, feed_cache, follows
+from posts.conditional import conditional, follow_generation
+from posts.models import COMMENT_ORDERING, Comment, Group, Post, User
+from posts.paginator import CursorPaginator
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse(
+                {'detail': 'Нужно войти на сайт'}, status=401
+            )
+        return view(request, **kwargs)
+    return wrapper
+
+
+def _json(data):
+    return JsonResponse(
+        data, json_dumps_params={
+            'ensure_ascii': False, 'separators': (',', ':'),
+        },
+    )
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.PAGINATOR_PAGES))
+    except ValueError:
+        limit = settings.PAGINATOR_PAGES
+    return max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+
+def _page(request, queryset, serialize, **kwargs):
+    page = CursorPaginator(queryset, _limit(request), **kwargs).cursor_page(
+        request.GET.get('cursor')
+    )
+    return {
+        'results': [serialize(obj) for obj in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def _author(user):
+    return {'username': user.username, 'name': user.get_full_name()}
+
+
+def serialize_post(post):
+    group = post.group
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': _author(post.author),
+        'group': group and {'slug': group.slug, 'title': group.title},
+        'image': post.image.url if post.image else None,
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.id,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': {'username': comment.author.username},
+    }
+
+
+def _feed(request, queryset):
+    return _json(_page(request, queryset, serialize_post))
+
+
+def _group_id(slug):
+    return get_object_or_404(
+        Group.objects.values_list('id', flat=True), slug=slug
+    )
+
+
+def _author_id(username):
+    return get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username
+    )
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request: feed_cache.generation(feed_cache.INDEX))
+def index(request):
+    return _feed(request, Post.objects.for_feed())
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, slug: feed_cache.generation(
+    feed_cache.group_feed(_group_id(slug))
+))
+def group_posts(request, slug):
+    # группа уже проверена при расчёте ETag
+    return _feed(request, Post.objects.filter(group__slug=slug).for_feed())
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, username: feed_cache.generation(
+    feed_cache.author_feed(_author_id(username))
+))
+def profile(request, username):
+    return _feed(
+        request, Post.objects.filter(author__username=username).for_feed()
+    )
+
+
+@require_safe
+@replica_reads
+@login_required
+@conditional(
+    lambda request: follow_generation(request.user), private=True
+)
+def follow_index(request):
+    if not feed.is_materialized():
+        return _feed(request, feed.posts_for(request.user))
+    entries, ordering = feed.entries_for(request.user)
+    return _json(_page(
+        request, entries,
+        lambda entry: serialize_post(feed.as_post(entry)),
+        ordering=ordering,
+    ))
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, post_id: feed_cache.generation(
+    feed_cache.post_page(post_id)
+))
+def post_detail(request, post_id):
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
+    return _json(serialize_post(post))
+
+
+@require_safe
+@replica_reads
+@conditional(lambda request, post_id: feed_cache.generation(
+    feed_cache.post_page(post_id)
+))
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.values_list('id'), id=post_id)
+    return _json(_page(
+        request, Comment.objects.filter(post_id=post_id).for_post(),
+        serialize_comment, ordering=COMMENT_ORDERING,
+    ))
+
+
+@require_http_methods(['POST', 'DELETE'])
+@login_required
+def follow_authors(request):
+    """Подписка (POST) и отписка (DELETE) пачкой.
+
+    Тело — ``{"authors": ["username", ...]}`` с ``Content-Type:
+    application/json``; в ответе — на кого подписка действительно
+    изменилась и какие имена не найдены. Вход — сессией сайта, поэтому
+    запрос проверяется на CSRF: токен из cookie ``csrftoken`` передают
+    в заголовке ``X-CSRFToken``.
+    """
+    if request.content_type != 'application/json':
+        return JsonResponse(
+            {'detail': 'Ожидается Content-Type: application/json'},
+            status=415,
+        )
+    try:
+        usernames = json.loads(request.body)['authors']
+    except (ValueError, KeyError, TypeError):
+        usernames = None
+    if not isinstance(usernames, list) or not all(
+        isinstance(username, str) for username in usernames
+    ):
+        return JsonResponse(
+            {'detail': 'Ожидается {"authors": ["username", ...]}'},
+            status=400,
+        )
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return JsonResponse(
+            {'detail': f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов'},
+            status=400,
+        )
+    authors = follows.resolve(usernames)
+    if request.method == 'POST':
+        changed = {author_id for _, author_id in follows.follow(
+            (request.user.pk, author_id) for author_id in authors.values()
+        )}
+    else:
+        changed = follows.unfollow(request.user.pk, authors.values())
+    return _json({
+        'changed': sorted(
+            username for username, author_id in authors.items()
+            if author_id in changed
+        ),
+        'unknown': sorted(set(usernames) - set(authors)),
+    })
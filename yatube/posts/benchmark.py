@@ -0,0 +1,228 @@
+"""Нагрузочный прогон view постов.
+
+Каждый view опрашивается в ``concurrency`` потоков через тестовый
+клиент Django (внутри процесса, с подсчётом SQL-запросов) или по HTTP
+у запущенного сервера. Объекты для адресов берутся из базы, которую
+опрашивают: своей при прогоне клиентом, через API сервера по HTTP.
+Отчёт — перцентили задержки, пропускная
+способность и среднее число запросов; ``compare`` сверяет его
+с сохранённым базовым отчётом.
+"""
+import json
+import re
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def targets():
+    """URL для каждого view на самых «тяжёлых» объектах базы."""
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total').first()
+    author = User.objects.order_by('-stats__posts_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    reader = User.objects.order_by('-stats__following_count').first()
+    urls = {'posts:index': (reverse('posts:index'), None)}
+    if group:
+        urls['posts:group_list'] = (
+            reverse('posts:group_list', args=(group.slug,)), None
+        )
+    if author:
+        urls['posts:profile'] = (
+            reverse('posts:profile', args=(author.username,)), None
+        )
+    if post:
+        urls['posts:post_detail'] = (
+            reverse('posts:post_detail', args=(post.id,)), None
+        )
+    if reader and Follow.objects.filter(user=reader).exists():
+        urls['posts:follow_index'] = (reverse('posts:follow_index'), reader)
+    return urls
+
+
+class ClientDriver:
+    """Запросы через тестовый клиент; считает SQL своего потока."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def targets(self):
+        return targets()
+
+    def _client(self, user):
+        clients = self._local.__dict__.setdefault('clients', {})
+        if user not in clients:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            clients[user] = client
+        return clients[user]
+
+    def get(self, url, user):
+        client = self._client(user)
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+        return queries
+
+
+class HttpDriver:
+    """Запросы к запущенному серверу; SQL берётся из Server-Timing."""
+
+    # постов первой страницы API, из которых выбираются объекты
+    SAMPLE = 100
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def targets(self):
+        """URL для каждого view на объектах из базы самого сервера.
+
+        Локальная база может не совпадать с базой сервера, поэтому
+        объекты выбираются из свежих постов его API: пост с наибольшим
+        числом комментариев, самые частые автор и группа. Ленту подписок
+        HTTP-прогон пропускает: у него нет сессии.
+        """
+        url = f'{reverse("posts:api_index")}?limit={self.SAMPLE}'
+        with urllib.request.urlopen(self.base_url + url) as response:
+            posts = json.load(response)['results']
+        urls = {'posts:index': (reverse('posts:index'), None)}
+        if not posts:
+            return urls
+        post = max(posts, key=lambda item: item['comments_count'])
+        urls['posts:post_detail'] = (
+            reverse('posts:post_detail', args=(post['id'],)), None
+        )
+        authors = Counter(item['author']['username'] for item in posts)
+        urls['posts:profile'] = (
+            reverse('posts:profile', args=(authors.most_common(1)[0][0],)),
+            None,
+        )
+        groups = Counter(
+            item['group']['slug'] for item in posts if item['group']
+        )
+        if groups:
+            urls['posts:group_list'] = (
+                reverse(
+                    'posts:group_list', args=(groups.most_common(1)[0][0],)
+                ),
+                None,
+            )
+        return urls
+
+    def get(self, url, user):
+        with urllib.request.urlopen(self.base_url + url) as response:
+            response.read()
+            match = SERVER_TIMING_QUERIES.search(
+                response.headers.get('Server-Timing', '')
+            )
+        return int(match.group(1)) if match else None
+
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(driver, url, user, requests, concurrency, warmup=5):
+    for _ in range(warmup):
+        driver.get(url, user)
+
+    def one(_):
+        started = time.perf_counter()
+        queries = driver.get(url, user)
+        return time.perf_counter() - started, queries
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, range(requests)))
+    else:
+        samples = [one(i) for i in range(requests)]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency * 1000 for latency, _ in samples]
+    queries = [count for _, count in samples if count is not None]
+    return {
+        'requests': requests,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries': (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+    }
+
+
+def run(driver, requests=200, concurrency=4, views=None):
+    report = {}
+    for view, (url, user) in driver.targets().items():
+        if views and view not in views:
+            continue
+        report[view] = measure(driver, url, user, requests, concurrency)
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Регрессии относительно базового отчёта.
+
+    Задержка может вырасти не больше чем на ``tolerance`` (доля),
+    число SQL-запросов расти не может совсем.
+    """
+    regressions = []
+    for view, base in baseline.items():
+        current = report.get(view)
+        if current is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = base[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(
+                    f'{view}: {metric} {current[metric]} > {limit:.2f} '
+                    f'(база {base[metric]})'
+                )
+        if (
+            base.get('queries') is not None
+            and current.get('queries') is not None
+            and current['queries'] > base['queries']
+        ):
+            regressions.append(
+                f'{view}: запросов {current["queries"]} '
+                f'> {base["queries"]}'
+            )
+    return regressions
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save(path, data):
+    with open(path, 'w') as file:
+        json.dump(data, file, indent=2, ensure_ascii=False, sort_keys=True)
+        file.write('\n')
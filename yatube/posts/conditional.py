@@ -0,0 +1,179 @@
+"""Условные GET-запросы по поколениям ``feed_cache``.
+
+Страница сравнивается с копией клиента по поколению — времени
+последнего изменения данных, из которых она собрана. Поколения
+лежат в кэше, поэтому ответ ``304 Not Modified`` обходится
+без рендера и почти без запросов к базе.
+
+Тем же поколением проверяются целые страницы для анонимов
+в кэше сайта (``ANONYMOUS_PAGE_CACHE``): правка данных сдвигает
+поколение, и страница пересобирается при следующем запросе.
+
+Ответ из реплики, которая ещё не догнала поколение, уходит без
+валидаторов и не хранится прокси: иначе старые данные получили бы
+ETag новых, и клиенты сверялись бы с ним, пока лента не изменится.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from core.cache import stampede
+from core.db import routers
+from posts import feed_cache
+from posts.models import Follow
+
+PAGE_KEY = 'anonymous-page:{}'
+
+
+def follow_generation(user):
+    """Поколение ленты подписок: самое свежее у авторов и подписок."""
+    authors = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    return feed_cache.latest_generation(
+        feed_cache.follow_feed(user.id),
+        *(feed_cache.author_feed(author_id) for author_id in authors),
+    )
+
+
+def page_key(path):
+    """Ключ целой страницы по адресу вместе с параметрами."""
+    return PAGE_KEY.format(hashlib.sha1(path.encode()).hexdigest())
+
+
+def _page_cache(view, generation, etag, last_modified):
+    """Целые страницы анонимов в кэше, с версией-поколением."""
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        if (
+            not settings.ANONYMOUS_PAGE_CACHE
+            or request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated
+        ):
+            return view(request, **kwargs)
+
+        def render():
+            response = view(request, **kwargs)
+            # валидаторы версии, из которой собрана страница: устаревшая
+            # копия не должна уйти клиенту с ETag новой
+            tag = etag(request, **kwargs)
+            if tag is not None:
+                response['ETag'] = quote_etag(tag)
+                response['Last-Modified'] = http_date(
+                    last_modified(request, **kwargs).timestamp()
+                )
+            return response
+
+        response, fresh = stampede.get_or_set(
+            page_key(request.get_full_path()), render,
+            version=generation(request, **kwargs),
+            timeout=settings.ANONYMOUS_PAGE_CACHE_TTL,
+            stale=settings.ANONYMOUS_PAGE_CACHE_STALE,
+            cacheable=lambda response: (
+                response.status_code == 200 and not response.cookies
+            ),
+        )
+        request._stale_page = not fresh
+        return response
+    return wrapper
+
+
+def _etag(request, version, per_user):
+    if version is None:
+        return None
+    raw = f'{version!r}:{request.get_full_path()}'
+    if per_user:
+        raw += f':{request.user.pk}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _validated(request, version):
+    """Поколение для валидаторов ответа.
+
+    ``None``, если данные читаются из реплики, отстающей от поколения.
+    """
+    if not hasattr(request, '_replica_behind'):
+        request._replica_behind = version > routers.synced_as_of()
+    return None if request._replica_behind else version
+
+
+def _decorate(generation_for, per_user, cache_control, cached=False):
+    def generation(request, **kwargs):
+        # нужно и для ETag, и для Last-Modified: считаем один раз
+        if not hasattr(request, '_generation'):
+            request._generation = generation_for(request, **kwargs)
+        return request._generation
+
+    def etag(request, **kwargs):
+        version = _validated(request, generation(request, **kwargs))
+        return _etag(request, version, per_user)
+
+    def last_modified(request, **kwargs):
+        version = _validated(request, generation(request, **kwargs))
+        if version is None:
+            return None
+        return datetime.fromtimestamp(version, timezone.utc)
+
+    def decorator(view):
+        if cached:
+            view = _page_cache(view, generation, etag, last_modified)
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            response = conditional_view(request, **kwargs)
+            private = cache_control(request, response)
+            if private or per_user:
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional(generation_for, private=False):
+    """ETag и Last-Modified для ответов API.
+
+    ``generation_for(request, **kwargs)`` возвращает поколение данных
+    ответа; ETag зависит ещё и от адреса, чтобы различались страницы.
+    Клиенты и прокси хранят ответ, но сверяют его перед показом.
+    """
+    def cache_control(request, response):
+        patch_cache_control(
+            response, no_cache=True,
+            **({'private': True} if private else {'public': True}),
+        )
+        return private
+    return _decorate(generation_for, False, cache_control)
+
+
+def page_conditional(generation_for):
+    """ETag и Last-Modified для HTML-страниц.
+
+    Страница зависит от пользователя (шапка, формы, кнопки), поэтому
+    ETag личный. Анонимные страницы общие: обратный прокси может
+    держать их ``HTML_SHARED_MAX_AGE`` секунд, браузер сверяет
+    каждый раз. Страницы вошедших пользователей — только в браузере.
+    Устаревшую копию, отданную на время пересборки или из отстающей
+    реплики, прокси не хранит.
+    """
+    def cache_control(request, response):
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+            return True
+        if (
+            getattr(request, '_stale_page', False)
+            or getattr(request, '_replica_behind', False)
+        ):
+            patch_cache_control(response, public=True, no_cache=True)
+            return False
+        patch_cache_control(
+            response, public=True, max_age=0,
+            s_maxage=settings.HTML_SHARED_MAX_AGE,
+        )
+        return False
+    return _decorate(generation_for, True, cache_control, cached=True)
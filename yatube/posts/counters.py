@@ -0,0 +1,194 @@
+"""Денормализованные счётчики постов, комментариев, подписок и групп.
+
+Сигналы меняют счётчики на единицу через ``F()``-выражения,
+а ``recount`` пересчитывает их по таблицам, исправляя расхождения.
+"""
+from django.db import transaction
+from django.db.models import (
+    Count, DateTimeField, F, Max, OuterRef, Subquery, Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from posts.models import (
+    Comment, Follow, Group, GroupStats, Post, User, UserStats,
+)
+
+BATCH_SIZE = 1000
+
+
+def _count(queryset, field, outer='pk'):
+    """Подзапрос: число строк ``queryset``, где ``field`` равно ``outer``."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def _user_counts(outer='pk'):
+    return {
+        'posts_count': _count(Post.objects.all(), 'author', outer),
+        'followers_count': _count(Follow.objects.all(), 'author', outer),
+        'following_count': _count(Follow.objects.all(), 'user', outer),
+    }
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики одного пользователя по таблицам."""
+    counts = User.objects.filter(pk=user_id).values(
+        **_user_counts()
+    ).first()
+    if counts is None:
+        return None
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=counts
+    )
+    return stats
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пачки пользователей одним ``UPDATE``."""
+    user_ids = set(user_ids)
+    existing = UserStats.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', flat=True
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in user_ids - set(existing)],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        **_user_counts(outer='user_id')
+    )
+
+
+def change_user(user_id, create=True, **deltas):
+    """Сдвигает счётчики пользователя на ``deltas``.
+
+    Если строки счётчиков ещё нет, при ``create`` она создаётся
+    пересчётом: сигнал приходит уже после записи в таблицу.
+    """
+    # счётчики беззнаковые: уменьшаем только то, что больше нуля
+    lookups = {
+        f'{name}__gte': -delta for name, delta in deltas.items() if delta < 0
+    }
+    updated = UserStats.objects.filter(user_id=user_id, **lookups).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+    if not updated and create:
+        recount_user(user_id)
+
+
+def change_post(post_id, delta):
+    Post.objects.filter(
+        pk=post_id, comments_count__gte=max(-delta, 0)
+    ).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def _latest_post(group_id):
+    # последний пост группы — по индексу (group, -pub_date, -id)
+    return Post.objects.filter(group_id=group_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date').first() or (None, None)
+
+
+def _last_activity(group_id, last_pub_date):
+    """Последний пост или комментарий группы, что позже."""
+    last_comment = Comment.objects.filter(
+        post__group_id=group_id
+    ).aggregate(last=Max('created'))['last']
+    if last_comment and (not last_pub_date or last_comment > last_pub_date):
+        return last_comment
+    return last_pub_date
+
+
+def recount_group(group_id):
+    """Пересчитывает счётчики группы по таблицам."""
+    last_post, pub_date = _latest_post(group_id)
+    GroupStats.objects.update_or_create(group_id=group_id, defaults={
+        'posts_count': Post.objects.filter(group_id=group_id).count(),
+        'last_post_id': last_post,
+        'last_activity': _last_activity(group_id, pub_date),
+    })
+
+
+def _later(field, moment):
+    """Более поздняя из даты в поле и ``moment``; поле может быть пустым."""
+    moment = Value(moment, output_field=DateTimeField())
+    return Greatest(Coalesce(field, moment), moment)
+
+
+def group_post_added(group_id, moved_post_id=None):
+    """Пост появился в группе: публикация или перенос из другой.
+
+    Перенесённый пост приносит с собой и свои комментарии.
+    """
+    last_post, last_activity = _latest_post(group_id)
+    if moved_post_id is not None:
+        last_comment = Comment.objects.filter(
+            post_id=moved_post_id
+        ).aggregate(last=Max('created'))['last']
+        if last_comment and last_comment > last_activity:
+            last_activity = last_comment
+    updated = GroupStats.objects.filter(group_id=group_id).update(
+        posts_count=F('posts_count') + 1,
+        last_post_id=last_post,
+        last_activity=_later('last_activity', last_activity),
+    )
+    if not updated:
+        recount_group(group_id)
+
+
+def group_post_removed(group_id):
+    """Пост удалён из группы или перенесён в другую.
+
+    Время активности могло дать только что ушедший пост или его
+    комментарии, поэтому оно пересчитывается, как в ``recount_group``.
+    """
+    last_post, pub_date = _latest_post(group_id)
+    GroupStats.objects.filter(
+        group_id=group_id, posts_count__gte=1
+    ).update(
+        posts_count=F('posts_count') - 1,
+        last_post_id=last_post,
+        last_activity=_last_activity(group_id, pub_date),
+    )
+
+
+def group_activity(group_id, moment):
+    """Новый комментарий в посте группы."""
+    GroupStats.objects.filter(group_id=group_id).update(
+        last_activity=_later('last_activity', moment)
+    )
+
+
+def stats_for(user):
+    """Счётчики пользователя одной строкой, без агрегатов."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def recount():
+    """Пересчитывает все счётчики, создавая недостающие строки."""
+    with transaction.atomic():
+        missing = User.objects.filter(stats__isnull=True).values_list(
+            'pk', flat=True
+        )
+        batch = []
+        for user_id in missing.iterator():
+            batch.append(UserStats(user_id=user_id))
+            if len(batch) >= BATCH_SIZE:
+                UserStats.objects.bulk_create(batch)
+                batch = []
+        UserStats.objects.bulk_create(batch)
+        UserStats.objects.update(**_user_counts(outer='user_id'))
+        Post.objects.update(
+            comments_count=_count(Comment.objects.all(), 'post')
+        )
+        for group_id in Group.objects.values_list('pk', flat=True).iterator():
+            recount_group(group_id)
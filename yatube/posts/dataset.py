@@ -0,0 +1,230 @@
+"""Потоковый экспорт и импорт данных Yatube в NDJSON.
+
+Одна строка — одна запись в формате ``dumpdata``:
+``{"model": "posts.post", "pk": 1, "fields": {...}}``. Модели идут
+в порядке внешних ключей: пользователи, группы, посты, комментарии,
+подписки. Экспорт читает таблицы через ``iterator()``, импорт пишет
+пачками через ``bulk_create``, поэтому память не зависит от объёма
+данных. Файл можно сжать gzip или zstd (нужен пакет ``zstandard``).
+
+Производные таблицы (счётчики, ленты, поисковый индекс) не
+выгружаются — после импорта они пересобираются.
+"""
+import gzip
+import io
+import json
+import sys
+from datetime import datetime
+from contextlib import ExitStack, contextmanager
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.seeding import explicit_dates, finish, reset_sequences
+
+FORMAT = 'yatube-ndjson'
+VERSION = 1
+
+MODELS = (User, Group, Post, Comment, Follow)
+
+CHUNK_SIZE = 2000
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class DatasetError(Exception):
+    pass
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder обрезает время до миллисекунд
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _fields(model):
+    """Имена и столбцы полей модели, кроме первичного ключа."""
+    return [
+        (field.name, field.attname)
+        for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise DatasetError('Для zstd нужен пакет zstandard')
+    return zstandard
+
+
+def compression_for(path):
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+@contextmanager
+def writer(path, compression=None):
+    """Текстовый поток для записи; ``-`` — стандартный вывод."""
+    if compression == 'zstd':
+        zstandard = _zstandard()
+    with ExitStack() as stack:
+        if path == '-':
+            raw = sys.stdout.buffer
+        else:
+            raw = stack.enter_context(open(path, 'wb'))
+        if compression == 'gzip':
+            raw = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='wb'))
+        elif compression == 'zstd':
+            raw = stack.enter_context(
+                zstandard.ZstdCompressor().stream_writer(
+                    raw, closefd=False
+                )
+            )
+        text = io.TextIOWrapper(raw, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            # detach дописывает буфер и не закрывает поток под собой
+            text.detach()
+
+
+@contextmanager
+def reader(path):
+    """Текстовый поток для чтения; сжатие узнаётся по сигнатуре."""
+    with ExitStack() as stack:
+        if path == '-':
+            raw = io.BufferedReader(sys.stdin.buffer)
+        else:
+            raw = stack.enter_context(open(path, 'rb'))
+        magic = raw.peek(4)[:4]
+        if magic.startswith(GZIP_MAGIC):
+            raw = stack.enter_context(gzip.GzipFile(fileobj=raw, mode='rb'))
+        elif magic == ZSTD_MAGIC:
+            raw = io.BufferedReader(stack.enter_context(
+                _zstandard().ZstdDecompressor().stream_reader(
+                    raw, closefd=False
+                )
+            ))
+        text = io.TextIOWrapper(raw, encoding='utf-8')
+        try:
+            yield text
+        finally:
+            text.detach()
+
+
+def export(stream, progress=None):
+    """Пишет все модели в ``stream`` построчно."""
+    encoder = Encoder(ensure_ascii=False)
+    stream.write(encoder.encode({
+        'format': FORMAT,
+        'version': VERSION,
+        'models': [_label(model) for model in MODELS],
+    }) + '\n')
+    counts = {}
+    for model in MODELS:
+        label = _label(model)
+        fields = _fields(model)
+        rows = model._default_manager.order_by('pk').values_list(
+            'pk', *(attname for _, attname in fields)
+        ).iterator(chunk_size=CHUNK_SIZE)
+        count = 0
+        for pk, *values in rows:
+            stream.write(encoder.encode({
+                'model': label,
+                'pk': pk,
+                'fields': {
+                    name: value for (name, _), value in zip(fields, values)
+                },
+            }) + '\n')
+            count += 1
+            if progress and not count % CHUNK_SIZE:
+                progress(model, count)
+        counts[label] = count
+    return counts
+
+
+def _records(stream):
+    lines = iter(stream)
+    header = json.loads(next(lines, 'null'))
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise DatasetError('Это не выгрузка Yatube')
+    if header.get('version') != VERSION:
+        raise DatasetError(
+            f'Неизвестная версия выгрузки: {header.get("version")}'
+        )
+    for number, line in enumerate(lines, start=2):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                raise DatasetError(f'Строка {number}: испорченный JSON')
+
+
+def _object(model, record, number):
+    """Объект модели из записи; поля сверяются с моделью."""
+    attnames = dict(_fields(model))
+    fields = record.get('fields')
+    if 'pk' not in record or not isinstance(fields, dict):
+        raise DatasetError(f'Строка {number}: нужны «pk» и «fields»')
+    unknown = sorted(set(fields) - set(attnames))
+    if unknown:
+        raise DatasetError(
+            f'Строка {number}: у {_label(model)} нет полей '
+            f'{", ".join(unknown)}'
+        )
+    obj = model(pk=record['pk'])
+    for name, value in fields.items():
+        setattr(obj, attnames[name], value)
+    return obj
+
+
+def load(stream, progress=None):
+    """Загружает выгрузку в пустые таблицы одной транзакцией."""
+    models = {_label(model): model for model in MODELS}
+    counts = dict.fromkeys(models, 0)
+    dated = [
+        field for model in MODELS for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    with transaction.atomic(), explicit_dates(*dated):
+        batch, model = [], None
+        for number, record in _records(stream):
+            if not isinstance(record, dict):
+                raise DatasetError(f'Строка {number}: ожидается объект')
+            record_model = models.get(record.get('model'))
+            if record_model is None:
+                raise DatasetError(
+                    f'Строка {number}: неизвестная модель '
+                    f'{record.get("model")}'
+                )
+            if record_model is not model or len(batch) >= CHUNK_SIZE:
+                _flush(model, batch, counts, progress)
+                batch, model = [], record_model
+            batch.append(_object(model, record, number))
+        _flush(model, batch, counts, progress)
+        reset_sequences(*MODELS)
+        finish()
+    return counts
+
+
+def _flush(model, batch, counts, progress):
+    if not batch:
+        return
+    model._default_manager.bulk_create(batch)
+    label = _label(model)
+    counts[label] += len(batch)
+    if progress:
+        progress(model, counts[label])
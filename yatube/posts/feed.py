@@ -0,0 +1,147 @@
+"""Лента подписок: сборка при чтении или материализация при записи.
+
+Стратегия выбирается настройкой ``FOLLOW_FEED_STRATEGY``:
+
+* ``'read'`` — лента собирается запросом ``Post`` ⇄ ``Follow``;
+* ``'write'`` — новый пост раскладывается в ``FeedEntry`` подписчиков,
+  а лента читается одним диапазоном по индексу ``(user, pub_date)``.
+
+Посты авторов, у которых подписчиков не меньше
+``FOLLOW_FEED_CELEBRITY_FOLLOWERS``, не раскладываются при записи:
+если такие авторы есть в подписках, лента читается из постов —
+записей ``FeedEntry`` вместе с постами популярных авторов. Чтение
+ленты ничего не пишет, поэтому его можно отдавать репликам.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from posts.models import FEED_FIELDS, FeedEntry, Follow, Post, UserStats
+
+READ = 'read'
+WRITE = 'write'
+
+BATCH_SIZE = 500
+
+
+def is_materialized():
+    return settings.FOLLOW_FEED_STRATEGY == WRITE
+
+
+def _entry(user_id, post):
+    return FeedEntry(
+        user_id=user_id,
+        post_id=post.id,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def _insert(entries):
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    limit = settings.FOLLOW_FEED_CELEBRITY_FOLLOWERS
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True
+        )[:limit]
+    )
+    if len(followers) >= limit:
+        return
+    _insert([_entry(user_id, post) for user_id in followers])
+
+
+def _latest(author_id):
+    return list(Post.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'pub_date'
+    )[:settings.FOLLOW_FEED_BACKFILL])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    _insert([_entry(user_id, post) for post in _latest(author_id)])
+
+
+def backfill_many(pairs):
+    """``backfill`` для пачки пар (читатель, автор) одной вставкой.
+
+    Посты каждого автора читаются один раз, сколько бы читателей
+    на него ни подписалось.
+    """
+    latest = {}
+    entries = []
+    for user_id, author_id in pairs:
+        if author_id not in latest:
+            latest[author_id] = _latest(author_id)
+        entries.extend(_entry(user_id, post) for post in latest[author_id])
+    _insert(entries)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def prune_many(user_id, author_ids):
+    """``prune`` для нескольких авторов одним запросом."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def celebrities(user):
+    """Авторы из подписок пользователя, чьи посты читаются при чтении."""
+    return UserStats.objects.filter(
+        user__following__user=user,
+        followers_count__gte=settings.FOLLOW_FEED_CELEBRITY_FOLLOWERS,
+    ).values_list('user_id', flat=True)
+
+
+def rebuild(user_ids=None):
+    """Пересобирает материализованные ленты целиком."""
+    follows = Follow.objects.all()
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        FeedEntry.objects.filter(user_id__in=user_ids).delete()
+    else:
+        FeedEntry.objects.all().delete()
+    for user_id, author_id in follows.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        backfill(user_id, author_id)
+
+
+def entries_for(user):
+    """Лента для постраничного чтения: queryset и его сортировка.
+
+    Без популярных авторов в подписках — записи ``FeedEntry`` одним
+    диапазоном по индексу, иначе — посты из записей и посты этих
+    авторов. Ключи сортировки у обоих совпадают по значениям, так что
+    курсор переходит из одного вида в другой; ``as_post`` достаёт
+    пост из элемента страницы.
+    """
+    author_ids = list(celebrities(user))
+    if author_ids:
+        return Post.objects.filter(
+            Q(id__in=FeedEntry.objects.filter(user=user).values('post_id'))
+            | Q(author_id__in=author_ids)
+        ).for_feed(), ('-pub_date', '-id')
+    return FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    ).only(
+        'pub_date', 'post', *(f'post__{field}' for field in FEED_FIELDS)
+    ), ('-pub_date', '-post_id')
+
+
+def as_post(item):
+    """Пост элемента ленты из ``entries_for``."""
+    return item.post if isinstance(item, FeedEntry) else item
+
+
+def posts_for(user):
+    """Лента подписок, собираемая при чтении."""
+    return Post.objects.filter(author__following__user=user).for_feed()
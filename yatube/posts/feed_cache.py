@@ -0,0 +1,120 @@
+"""Версионированный кэш лент.
+
+У каждой ленты (главная, группа, автор) есть поколение — время
+последнего изменения её постов. Сигналы ``Post`` сдвигают поколение
+после фиксации транзакции.
+Фрагмент страницы ленты кэшируется по ленте и странице или курсору,
+а поколение служит его версией (``{% stampede_cache %}``): после правки
+фрагмент устаревает, его пересобирает один запрос, остальные на это
+время получают прежний.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import stampede
+from posts.paginator import CursorPaginator
+
+INDEX = 'index'
+# рекомендации авторов: сдвигается после каждого пересчёта
+SUGGESTIONS = 'suggestions'
+# «Популярное»: сдвигается, когда update_trending учёл новые события
+TRENDING = 'trending'
+# каталог групп: сдвигается при изменении счётчиков групп
+GROUPS = 'groups'
+
+GENERATION_KEY = 'feed-generation:{}'
+FIRST_PAGE_KEY = 'feed-first-page:{}'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def author_feed(author_id):
+    return f'author:{author_id}'
+
+
+def follow_feed(user_id):
+    """Поколение подписок читателя: сдвигается при (от)писке."""
+    return f'follow:{user_id}'
+
+
+def profile_page(user_id):
+    """Поколение страницы профиля: сдвигается при смене подписчиков."""
+    return f'profile:{user_id}'
+
+
+def post_page(post_id):
+    """Поколение поста: сдвигается при правке поста и комментариях."""
+    return f'post:{post_id}'
+
+
+def post_feeds(author_id, *group_ids):
+    """Ленты, в которых показывается пост."""
+    feeds = [INDEX, author_feed(author_id)]
+    feeds.extend(
+        group_feed(group_id) for group_id in set(group_ids) if group_id
+    )
+    return feeds
+
+
+def generation(feed):
+    key = GENERATION_KEY.format(feed)
+    value = cache.get(key)
+    if value is None:
+        # поколение вытеснено из кэша: начинаем новое
+        cache.add(key, time.time(), None)
+        value = cache.get(key)
+    return value
+
+
+def latest_generation(*feeds):
+    """Самое свежее поколение из нескольких лент, одним обращением."""
+    keys = {GENERATION_KEY.format(feed): feed for feed in feeds}
+    found = cache.get_many(keys)
+    values = list(found.values())
+    values.extend(generation(keys[key]) for key in keys if key not in found)
+    return max(values)
+
+
+def bump(*feeds):
+    """Делает устаревшими все закэшированные страницы лент."""
+    now = time.time()
+    cache.set_many(
+        {GENERATION_KEY.format(feed): now for feed in feeds}, None
+    )
+
+
+def page_key(feed, page_obj):
+    """Ключ страницы ленты для ``{% stampede_cache %}``."""
+    cursor = getattr(page_obj, 'cursor', '')
+    return f'{feed}:{page_obj.number or ""}:{cursor}'
+
+
+def context(feed, page_obj):
+    return {
+        'feed_cache_key': page_key(feed, page_obj),
+        'feed_cache_version': generation(feed),
+        'feed_cache_ttl': settings.FEED_CACHE_TTL,
+    }
+
+
+def first_page(feed, queryset):
+    """Первая страница ленты курсором, из кэша с версией-поколением.
+
+    В кэше лежат сами посты, а не только разметка: открытие ленты
+    обходится без запроса к постам, пока лента не изменилась.
+    """
+    paginator = CursorPaginator(queryset, settings.PAGINATOR_PAGES)
+
+    def build():
+        page = paginator.cursor_page()
+        return list(page), page.next_cursor
+
+    (object_list, next_cursor), _ = stampede.get_or_set(
+        FIRST_PAGE_KEY.format(feed), build,
+        version=generation(feed), timeout=settings.FEED_CACHE_TTL,
+    )
+    return paginator.make_page(object_list, next_cursor=next_cursor)
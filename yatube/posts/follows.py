@@ -0,0 +1,97 @@
+"""Массовые подписки и отписки.
+
+Одиночная подписка обновляет счётчики, ленты и кэш сигналами
+``Follow`` — по несколько запросов на каждую. Здесь пачка подписок
+вставляется одним ``bulk_create`` без сигналов (повторы отсекает
+ограничение ``unique subs``), а счётчики, материализованные ленты
+и поколения кэша обновляются за один проход по всей пачке.
+"""
+import re
+from functools import partial
+
+from django.db import transaction
+
+from posts import counters, feed, feed_cache, recommendations
+from posts.models import Follow, User
+
+BATCH_SIZE = 1000
+
+
+def parse_usernames(values):
+    """Имена из полей формы: по одному или списком через пробел и запятую."""
+    usernames = []
+    for value in values:
+        usernames.extend(name for name in re.split(r'[\s,]+', value) if name)
+    return usernames
+
+
+def resolve(usernames):
+    """``{username: id}`` существующих пользователей одним запросом."""
+    return dict(User.objects.filter(
+        username__in=set(usernames)
+    ).values_list('username', 'pk'))
+
+
+def _existing(pairs):
+    users = {user_id for user_id, _ in pairs}
+    authors = {author_id for _, author_id in pairs}
+    found = Follow.objects.filter(
+        user_id__in=users, author_id__in=authors
+    ).values_list('user_id', 'author_id')
+    return pairs & set(found)
+
+
+def _changed(pairs):
+    users = {user_id for user_id, _ in pairs}
+    authors = {author_id for _, author_id in pairs}
+    counters.recount_users(users | authors)
+    recommendations.mark_stale(users)
+    transaction.on_commit(partial(
+        feed_cache.bump,
+        *(feed_cache.follow_feed(user_id) for user_id in users),
+        *(feed_cache.profile_page(user_id) for user_id in users | authors),
+    ))
+
+
+@transaction.atomic
+def follow(pairs):
+    """Подписывает читателей на авторов по парам ``(user_id, author_id)``.
+
+    Возвращает множество действительно новых подписок; подписки
+    на себя и уже существующие пропускаются.
+    """
+    pairs = {
+        (user_id, author_id) for user_id, author_id in pairs
+        if user_id != author_id
+    }
+    if not pairs:
+        return set()
+    created = pairs - _existing(pairs)
+    Follow.objects.bulk_create(
+        [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in created
+        ],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    if created:
+        _changed(created)
+        if feed.is_materialized():
+            feed.backfill_many(created)
+    return created
+
+
+@transaction.atomic
+def unfollow(user_id, author_ids):
+    """Отписывает читателя от авторов, возвращает id тех, от кого отписал."""
+    follows = Follow.objects.filter(user_id=user_id, author_id__in=author_ids)
+    removed = set(follows.values_list('author_id', flat=True))
+    if not removed:
+        return removed
+    # обычный delete() ради сигналов читает строки и шлёт сигнал
+    # на каждую, а счётчики и ленты здесь обновляются пачкой
+    follows._raw_delete(follows.db)
+    _changed({(user_id, author_id) for author_id in removed})
+    if feed.is_materialized():
+        feed.prune_many(user_id, removed)
+    return removed
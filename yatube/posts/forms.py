@@ -1,5 +1,11 @@
+import os
+
 from django import forms
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
 
+from posts import images
 from posts.models import Post, Comment
 
 
@@ -12,6 +18,27 @@ class PostForm(forms.ModelForm):
             'image',
         )
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        self.original_image = None
+        if not isinstance(image, UploadedFile):
+            return image
+        normalized = images.normalize(image)
+        if normalized is not image and settings.IMAGE_KEEP_ORIGINAL:
+            self.original_image = image
+        return normalized
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        original = getattr(self, 'original_image', None)
+        if original is not None:
+            original.seek(0)
+            default_storage.save(
+                os.path.join('posts', 'originals', original.name), original
+            )
+            self.original_image = None
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,99 @@
+"""Обработка картинок постов при загрузке.
+
+Картинка проверяется по заголовку, до декодирования пикселей:
+слишком большие по площади (decompression bomb) отклоняются.
+Остальные поворачиваются по EXIF, уменьшаются до ``IMAGE_MAX_SIZE``
+и пережимаются без метаданных; маленькие «чистые» файлы
+сохраняются как есть.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+KEEP_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# EXIF-тег ориентации снимка
+ORIENTATION = 0x0112
+
+
+def _open(upload):
+    upload.seek(0)
+    try:
+        # Image.open читает только заголовок, пиксели ещё не декодированы
+        return Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+
+
+def _needs_processing(image, upload):
+    max_width, max_height = settings.IMAGE_MAX_SIZE
+    width, height = image.size
+    return (
+        width > max_width
+        or height > max_height
+        or image.format not in KEEP_FORMATS
+        or upload.size > settings.IMAGE_REENCODE_BYTES
+        or 'exif' in image.info
+        or image.getexif().get(ORIENTATION, 1) != 1
+    )
+
+
+def _has_alpha(image):
+    return (
+        image.mode in ('RGBA', 'LA', 'PA')
+        or 'transparency' in image.info
+    )
+
+
+def normalize(upload):
+    """Готовит загруженную картинку к сохранению.
+
+    Возвращает исходный файл, если обработка не нужна, или новый
+    файл JPEG/PNG. Бросает ``ValidationError`` для слишком больших
+    и битых картинок.
+    """
+    image = _open(upload)
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s точек.',
+            code='image_too_large',
+            params={'width': width, 'height': height},
+        )
+    if not _needs_processing(image, upload):
+        upload.seek(0)
+        return upload
+
+    max_size = settings.IMAGE_MAX_SIZE
+    # JPEG сразу декодируется в уменьшенном масштабе
+    image.draft('RGB', max_size)
+    try:
+        image = ImageOps.exif_transpose(image)
+    except OSError:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    image.thumbnail(max_size, Image.LANCZOS)
+
+    buffer = BytesIO()
+    if _has_alpha(image):
+        image.convert('RGBA').save(buffer, 'PNG', optimize=True)
+        extension, content_type = 'png', 'image/png'
+    else:
+        image.convert('RGB').save(
+            buffer, 'JPEG',
+            quality=settings.IMAGE_JPEG_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        extension, content_type = 'jpg', 'image/jpeg'
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{name}.{extension}', buffer.getvalue(), content_type
+    )
@@ -0,0 +1,130 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark, seeding
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, 'benchmarks', 'baseline.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон index, group_list, profile, post_detail '
+        'и follow_index на синтетических данных во временной базе. '
+        'Падает, если результат хуже базового отчёта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='среднее число подписок на пользователя',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='запросов к каждому view',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--view', action='append', dest='views',
+            help='имя view, например posts:index; можно несколько раз',
+        )
+        parser.add_argument(
+            '--url',
+            help=(
+                'адрес запущенного сервера: прогон по HTTP, объекты '
+                'для адресов берутся из его API'
+            ),
+        )
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='записать результат как новый базовый отчёт',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help='допустимый рост задержки, доля от базовой',
+        )
+
+    def handle(self, *args, **options):
+        scale = seeding.Scale(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'],
+        )
+        run_options = {
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'views': options['views'],
+        }
+        if options['url']:
+            views = benchmark.run(
+                benchmark.HttpDriver(options['url']), **run_options
+            )
+        else:
+            views = self.run_local(scale, options['seed'], run_options)
+        report = {
+            'scale': scale._asdict(),
+            'concurrency': options['concurrency'],
+            'views': views,
+        }
+        self.write_report(views)
+
+        if options['save_baseline']:
+            path = options['baseline']
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            benchmark.save(path, report)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовый отчёт записан в {path}'
+            ))
+            return
+        self.check_baseline(
+            report, options['baseline'], options['tolerance']
+        )
+
+    def run_local(self, scale, seed, run_options):
+        self.stdout.write(f'Генерация данных: {scale}')
+        with seeding.temporary_database(scale, seed):
+            return benchmark.run(benchmark.ClientDriver(), **run_options)
+
+    def write_report(self, views):
+        self.stdout.write(
+            f'{"view":<20} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"p99 ms":>8} {"sql":>6}'
+        )
+        for view, stats in views.items():
+            queries = stats['queries']
+            self.stdout.write(
+                f'{view:<20} {stats["rps"]:>8} {stats["p50_ms"]:>8} '
+                f'{stats["p95_ms"]:>8} {stats["p99_ms"]:>8} '
+                f'{"-" if queries is None else queries:>6}'
+            )
+
+    def check_baseline(self, report, path, tolerance):
+        if not os.path.exists(path):
+            self.stdout.write('Базового отчёта нет, сравнивать не с чем')
+            return
+        baseline = benchmark.load(path)
+        if (
+            baseline.get('scale') != report['scale']
+            or baseline.get('concurrency') != report['concurrency']
+        ):
+            self.stdout.write(self.style.WARNING(
+                'Объём данных или число потоков отличаются от базового '
+                'отчёта, сравнение пропущено'
+            ))
+            return
+        regressions = benchmark.compare(
+            report['views'], baseline['views'], tolerance
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессия производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
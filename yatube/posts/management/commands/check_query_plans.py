@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import query_plans, seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Открывает страницы и API постов на синтетических данных '
+        'во временной базе и проверяет EXPLAIN QUERY PLAN каждого '
+        'их запроса. Падает, если какой-то запрос проходит таблицу '
+        'целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=4000)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--allow', action='append', default=[], metavar='TABLE',
+            help='таблица, которую можно проходить целиком; '
+                 'можно несколько раз',
+        )
+
+    def handle(self, *args, **options):
+        scale = seeding.Scale(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'],
+        )
+        self.stdout.write(f'Генерация данных: {scale}')
+        with seeding.temporary_database(scale, options['seed']):
+            try:
+                views = query_plans.check()
+            except RuntimeError as error:
+                raise CommandError(error)
+
+        allowed = set(options['allow'])
+        problems = 0
+        for view, queries in views.items():
+            self.stdout.write(f'{view}: {len(queries)} запросов')
+            for query in queries:
+                scans = [
+                    detail for detail in query.full_scans()
+                    if query_plans.scanned_table(detail, query.limited)
+                    not in allowed
+                ]
+                if scans:
+                    problems += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'  {", ".join(scans)}\n    {query.sql}'
+                    ))
+                elif options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'  {"; ".join(query.plan)}\n    {query.sql}'
+                    )
+        if problems:
+            raise CommandError(
+                f'Запросов с полным проходом таблицы: {problems}'
+            )
+        self.stdout.write(self.style.SUCCESS('Полных проходов нет'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON построчно, не держа таблицы в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл выгрузки; - — стандартный вывод',
+        )
+        parser.add_argument(
+            '--compress', choices=('gzip', 'zstd', 'none'),
+            help='сжатие; по умолчанию по расширению .gz или .zst',
+        )
+
+    def handle(self, *args, path, compress, **options):
+        if compress is None:
+            compress = dataset.compression_for(path)
+        elif compress == 'none':
+            compress = None
+        try:
+            with dataset.writer(path, compress) as stream:
+                counts = dataset.export(stream)
+        except dataset.DatasetError as error:
+            raise CommandError(error)
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(
+                'Выгружено: ' + ', '.join(
+                    f'{label}: {count}' for label, count in counts.items()
+                )
+            ))
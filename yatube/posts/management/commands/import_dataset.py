@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_dataset в пустую базу пачками '
+        'с сохранением id и пересобирает счётчики, ленты и поиск.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл выгрузки, можно сжатый; - — стандартный ввод',
+        )
+
+    def handle(self, *args, path, **options):
+        try:
+            with dataset.reader(path) as stream:
+                counts = dataset.load(stream)
+        except dataset.DatasetError as error:
+            raise CommandError(error)
+        except IntegrityError as error:
+            raise CommandError(
+                f'Данные конфликтуют с уже существующими: {error}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{label}: {count}' for label, count in counts.items()
+            )
+        ))
@@ -0,0 +1,72 @@
+import csv
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import dataset, follows
+from posts.models import User
+
+HEADER = ['user', 'author']
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает подписки из CSV «читатель,автор» потоком, пачками '
+        'через массовую подписку; уже существующие пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='файл CSV, можно сжатый; - — стандартный ввод',
+        )
+        parser.add_argument(
+            '--ids', action='store_true',
+            help='в столбцах id пользователей, а не имена',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=follows.BATCH_SIZE,
+            help='строк в одной пачке (транзакции)',
+        )
+
+    def handle(self, *args, path, ids, batch_size, **options):
+        rows = created = skipped = 0
+        with dataset.reader(path) as stream:
+            records = csv.reader(stream)
+            while True:
+                batch = list(islice(records, batch_size))
+                if not batch:
+                    break
+                if rows == 0 and batch[0] == HEADER:
+                    batch = batch[1:]
+                rows += len(batch)
+                pairs = self.resolve(batch, ids)
+                skipped += len(batch) - len(pairs)
+                created += len(follows.follow(pairs))
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {rows}, новых подписок: {created}, '
+            f'с неизвестными пользователями: {skipped}'
+        ))
+
+    def resolve(self, batch, ids):
+        """Пары id из строк пачки; строки с неизвестными отбрасываются."""
+        try:
+            edges = [(user, author) for user, author in filter(None, batch)]
+        except ValueError:
+            raise CommandError('В каждой строке — читатель и автор')
+        if ids:
+            try:
+                edges = [(int(user), int(author)) for user, author in edges]
+            except ValueError as error:
+                raise CommandError(f'Не id пользователя: {error}')
+            names = {pk for edge in edges for pk in edge}
+            known = {pk: pk for pk in User.objects.filter(
+                pk__in=names
+            ).values_list('pk', flat=True)}
+        else:
+            known = follows.resolve(
+                name for edge in edges for name in edge
+            )
+        return [
+            (known[user], known[author]) for user, author in edges
+            if user in known and author in known
+        ]
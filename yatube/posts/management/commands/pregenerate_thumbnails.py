@@ -0,0 +1,63 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def image_chunks(chunk_size):
+    """Имена картинок постов пачками, по возрастанию id."""
+    last_id = 0
+    while True:
+        chunk = list(
+            Post.objects.filter(id__gt=last_id).exclude(image='')
+            .exclude(image__isnull=True).order_by('id')
+            .values_list('id', 'image')[:chunk_size]
+        )
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        yield [name for _, name in chunk]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее режет миниатюры POST_THUMBNAILS для картинок '
+        'существующих постов в нескольких процессах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='число процессов-воркеров',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=100,
+            help='сколько картинок отдавать воркеру за раз',
+        )
+
+    def handle(self, *args, processes, chunk_size, **options):
+        # spawn: воркеры не наследуют открытые соединения с базой
+        context = multiprocessing.get_context('spawn')
+        done = 0
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=django.setup,
+        ) as pool:
+            pending = set()
+            for names in image_chunks(chunk_size):
+                pending.add(pool.submit(thumbnails.generate_many, names))
+                if len(pending) >= processes * 2:
+                    finished, pending = wait(
+                        pending, return_when=FIRST_COMPLETED
+                    )
+                    done += sum(future.result() for future in finished)
+            done += sum(future.result() for future in pending)
+        self.stdout.write(self.style.SUCCESS(
+            f'Нарезаны миниатюры для {done} картинок'
+        ))
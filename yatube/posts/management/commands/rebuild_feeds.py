@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок (FeedEntry).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя; можно указать несколько раз',
+        )
+
+    def handle(self, *args, user_ids=None, **options):
+        feed.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает поисковый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='сколько постов читать из базы за один запрос',
+        )
+
+    def handle(self, *args, batch_size, **options):
+        search.get_backend().rebuild(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
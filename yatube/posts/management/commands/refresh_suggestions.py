@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «Кого почитать» читателей, чьи '
+        'подписки изменились, или всех (--all) по графу подписок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true', dest='everyone',
+            help='пересчитать всех читателей, а не только отмеченных',
+        )
+
+    def handle(self, *args, everyone, **options):
+        if everyone:
+            recommendations.refresh(progress=self.stdout.write)
+        elif recommendations.refresh_stale(self.stdout.write) is None:
+            self.stdout.write('Изменившихся подписок нет')
+            return
+        self.stdout.write(self.style.SUCCESS('Рекомендации пересчитаны'))
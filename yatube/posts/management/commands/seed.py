@@ -0,0 +1,81 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками. При одинаковом --seed данные '
+        'одинаковые.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000)
+        parser.add_argument(
+            '--follows', type=int, default=30,
+            help='среднее число подписок на пользователя',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='начало имён пользователей и адресов групп',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='за сколько последних дней публикуются посты',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='число процессов, генерирующих строки',
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='сколько картинок заготовить и раздать постам',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.3,
+            help='доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--password',
+            help='общий пароль пользователей; без него войти нельзя',
+        )
+
+    def handle(self, *args, **options):
+        scale = seeding.Scale(
+            options['users'], options['groups'], options['posts'],
+            options['comments'], options['follows'],
+        )
+        started = time.monotonic()
+
+        def progress(model, total):
+            self.stdout.write(
+                f'\r{model._meta.model_name}: {total}', ending=''
+            )
+
+        created = seeding.generate(
+            scale,
+            seed=options['seed'],
+            prefix=options['prefix'],
+            days=options['days'],
+            processes=options['processes'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            password=options['password'],
+            progress=progress if options['verbosity'] > 1 else None,
+        )
+        if options['verbosity'] > 1:
+            self.stdout.write('')
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.monotonic() - started:.0f} с — {summary}'
+        ))
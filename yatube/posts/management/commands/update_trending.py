@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import ranking
+
+
+class Command(BaseCommand):
+    help = (
+        'Учитывает в «Популярном» публикации, комментарии и подписки '
+        'после прошлого запуска; запускается периодически.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='пересчитать оценки с нуля по всем событиям',
+        )
+
+    def handle(self, *args, rebuild, **options):
+        update = ranking.rebuild if rebuild else ranking.update
+        total = update(progress=(
+            self.progress if options['verbosity'] > 1 else None
+        ))
+        self.stdout.write(self.style.SUCCESS(f'Учтено событий: {total}'))
+
+    def progress(self, source, total):
+        self.stdout.write(f'{source}: {total}')
@@ -0,0 +1,64 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count(model, field, outer):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk)
+         for pk in User.objects.values_list('pk', flat=True)),
+        batch_size=1000,
+    )
+    UserStats.objects.update(
+        posts_count=count(Post, 'author', 'user_id'),
+        followers_count=count(Follow, 'author', 'user_id'),
+        following_count=count(Follow, 'user', 'user_id'),
+    )
+    Post.objects.update(comments_count=count(Comment, 'post', 'pk'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    # обратный индекс есть только в SQLite; другие базы ищут через LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        "text, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, text) '
+        # «ё» индексируется как «е», см. posts.search
+        "SELECT id, replace(replace(text, 'ё', 'е'), 'Ё', 'Е') "
+        'FROM posts_post'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleSuggestions',
+            fields=[
+                ('user_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Устаревшие рекомендации',
+                'verbose_name_plural': 'Устаревшие рекомендации',
+            },
+        ),
+        migrations.CreateModel(
+            name='SuggestedAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='suggested_authors', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Рекомендованный автор',
+                'verbose_name_plural': 'Рекомендованные авторы',
+                'ordering': ('-score', 'author_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='suggestedauthor',
+            index=models.Index(fields=['user', '-score', 'author'], name='suggestion_user_score_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_suggestions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobCheckpoint',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Задача')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Последний id')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Отметка задачи',
+                'verbose_name_plural': 'Отметки задач',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingGroup',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Популярная группа',
+                'verbose_name_plural': 'Популярные группы',
+                'ordering': ('-score', '-group_id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingPost',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+            ],
+            options={
+                'verbose_name': 'Популярный пост',
+                'verbose_name_plural': 'Популярные посты',
+                'ordering': ('-score', '-post_id'),
+            },
+        ),
+        migrations.AddField(
+            model_name='follow',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата подписки'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='trendingpost',
+            index=models.Index(fields=['-score', '-post'], name='trending_post_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trendinggroup',
+            index=models.Index(fields=['-score', '-group'], name='trending_group_score_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max
+
+
+def fill_group_stats(apps, schema_editor):
+    # то же, что counters.recount_group, для каждой группы
+    Group = apps.get_model('posts', 'Group')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    stats = []
+    for group_id in Group.objects.values_list('pk', flat=True).iterator():
+        posts = Post.objects.filter(group_id=group_id)
+        last_post, last_activity = posts.order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', 'pub_date').first() or (None, None)
+        last_comment = Comment.objects.filter(
+            post__group_id=group_id
+        ).aggregate(last=Max('created'))['last']
+        if last_comment and (
+            not last_activity or last_comment > last_activity
+        ):
+            last_activity = last_comment
+        stats.append(GroupStats(
+            group_id=group_id,
+            posts_count=posts.count(),
+            last_post_id=last_post,
+            last_activity=last_activity,
+        ))
+    GroupStats.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('last_post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='posts.Post', verbose_name='Последний пост')),
+            ],
+            options={
+                'verbose_name': 'Счётчики группы',
+                'verbose_name_plural': 'Счётчики групп',
+            },
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,34 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Поля, которые шаблоны лент читают у поста, автора и группы
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'author', 'group', 'comments_count',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+
+# Порядок комментариев под постом: новые сверху, id — для курсора
+COMMENT_ORDERING = ('-created', '-id')
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним запросом."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
+    def for_detail(self):
+        """Пост для отдельной страницы вместе с автором и группой."""
+        return self.select_related('author', 'group')
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_post(self):
+        """Комментарии под постом вместе с авторами."""
+        return self.select_related('author').only(
+            'id', 'text', 'created', 'post', 'author', 'author__username'
+        )
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -36,19 +64,23 @@ class Post(models.Model):
         verbose_name='Дата',
         db_index=True,
     )
+    # отдельные индексы внешних ключей не нужны: их заменяют
+    # составные индексы из Meta, где ключ идёт первым
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='posts',
         help_text='Автор поста',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False,
     )
     group = models.ForeignKey(
         Group, blank=True, null=True,
         on_delete=models.SET_NULL,
         related_name='posts',
         help_text='Группа к которой относится пост',
-        verbose_name='Группа'
+        verbose_name='Группа',
+        db_index=False,
     )
     image = models.ImageField(
         'Картинка',
@@ -56,9 +88,25 @@ class Post(models.Model):
         blank=True,
         null=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
+        # ленты автора и группы: фильтр по ключу и порядок курсора
+        indexes = (
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -69,6 +117,7 @@ class Comment(models.Model):
         Post, on_delete=models.CASCADE,
         related_name='comments',
         verbose_name='Cтатья с комментариями',
+        db_index=False,
     )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -84,8 +133,15 @@ class Comment(models.Model):
         verbose_name='Дата публикации',
     )
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'),
+        )
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -94,16 +150,23 @@ class Comment(models.Model):
 
 
 class Follow(models.Model):
+    # подписки читателя ищутся по уникальному индексу (user, author),
+    # подписчики автора — по индексу внешнего ключа author
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='follower',
         verbose_name='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Отслеживается',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата подписки',
+    )
 
     class Meta:
         constraints = (
@@ -116,3 +179,198 @@ class Follow(models.Model):
 
         def __str__(self):
             return f'{self.user} подписан на {self.author}'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, поддерживаемые сигналами."""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Постов', default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        'Подписок', default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class GroupStats(models.Model):
+    """Счётчики группы для каталога групп, поддерживаемые сигналами."""
+    group = models.OneToOneField(
+        Group, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Группа',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Постов', default=0,
+    )
+    last_post = models.ForeignKey(
+        Post, on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='+',
+        verbose_name='Последний пост',
+    )
+    last_activity = models.DateTimeField(
+        'Последняя активность', null=True, blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики группы'
+        verbose_name_plural = 'Счётчики групп'
+
+    def __str__(self):
+        return f'Счётчики группы {self.group_id}'
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации поста',
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post',),
+                name='unique feed entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx'),
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx'),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+
+
+class SuggestedAuthor(models.Model):
+    """Рекомендация «Кого почитать», её считает ``refresh_suggestions``."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='suggested_authors',
+        verbose_name='Читатель',
+        # рекомендации читателя ищутся по индексу (user, -score, author)
+        db_index=False,
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('-score', 'author_id')
+        indexes = (
+            models.Index(
+                fields=('user', '-score', 'author'),
+                name='suggestion_user_score_idx'),
+        )
+        verbose_name = 'Рекомендованный автор'
+        verbose_name_plural = 'Рекомендованные авторы'
+
+
+class StaleSuggestions(models.Model):
+    """Читатель, чьи подписки изменились после расчёта рекомендаций.
+
+    Без внешнего ключа: отметку ставит сигнал удаления подписки,
+    в том числе когда удаляется сам пользователь.
+    """
+    user_id = models.IntegerField('Читатель', primary_key=True)
+
+    class Meta:
+        verbose_name = 'Устаревшие рекомендации'
+        verbose_name_plural = 'Устаревшие рекомендации'
+
+
+class JobCheckpoint(models.Model):
+    """Докуда периодическая задача уже обработала таблицу.
+
+    ``position`` — наибольший обработанный id: задача читает только
+    строки после него, по первичному ключу.
+    """
+    name = models.CharField('Задача', max_length=100, primary_key=True)
+    position = models.BigIntegerField('Последний id', default=0)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Отметка задачи'
+        verbose_name_plural = 'Отметки задач'
+
+    def __str__(self):
+        return f'{self.name}: {self.position}'
+
+
+class TrendingPost(models.Model):
+    """Оценка поста в «Популярном», её ведёт ``update_trending``."""
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Пост',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('-score', '-post_id')
+        indexes = (
+            models.Index(
+                fields=('-score', '-post'),
+                name='trending_post_score_idx'),
+        )
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+
+
+class TrendingGroup(models.Model):
+    """Оценка группы в «Популярном»: активность в её постах."""
+    group = models.OneToOneField(
+        Group, on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+        verbose_name='Группа',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        ordering = ('-score', '-group_id')
+        indexes = (
+            models.Index(
+                fields=('-score', '-group'),
+                name='trending_group_score_idx'),
+        )
+        verbose_name = 'Популярная группа'
+        verbose_name_plural = 'Популярные группы'
@@ -0,0 +1,128 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+NEXT = 'next'
+PREVIOUS = 'prev'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Paginator с режимом keyset-пагинации по ключу сортировки.
+
+    Обычные страницы (``?page=N``) работают как у ``Paginator``,
+    а ``cursor_page`` выбирает записи условием ``WHERE`` по ключу
+    последней показанной записи, без ``COUNT(*)`` и ``OFFSET``.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), **kwargs):
+        self.ordering = tuple(ordering)
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name in self._fields():
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        raw = json.dumps([direction] + values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, *values = json.loads(
+                base64.urlsafe_b64decode(padded.encode())
+            )
+        except (TypeError, ValueError, binascii.Error):
+            raise InvalidCursor(cursor)
+        fields = self._fields()
+        if direction not in (NEXT, PREVIOUS) or len(values) != len(fields):
+            raise InvalidCursor(cursor)
+        model = self.object_list.model
+        try:
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(fields, values)
+            ]
+        except Exception:
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _seek(self, values, direction):
+        """Условие «строго после ключа» в порядке сортировки."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            if direction == PREVIOUS:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def cursor_page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                cursor = None
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, direction))
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == PREVIOUS:
+            object_list.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = previous_cursor = None
+        if object_list and has_next:
+            next_cursor = self.encode_cursor(object_list[-1], NEXT)
+        if object_list and has_previous:
+            previous_cursor = self.encode_cursor(object_list[0], PREVIOUS)
+        return self.make_page(
+            object_list, cursor, next_cursor, previous_cursor
+        )
+
+    def make_page(self, object_list, cursor=None, next_cursor=None,
+                  previous_cursor=None):
+        """Страница курсора из готового списка, например из кэша."""
+        page = Page(object_list, None, self)
+        page.cursor = cursor or ''
+        page.next_cursor = next_cursor
+        page.previous_cursor = previous_cursor
+        return page
+
+
+def get_page(request, object_list, per_page=None, **kwargs):
+    """Страница для шаблона: ``?page=N`` или курсор из ``?cursor=``."""
+    paginator = CursorPaginator(
+        object_list, per_page or settings.PAGINATOR_PAGES, **kwargs
+    )
+    page_number = request.GET.get('page')
+    if page_number is not None or not settings.PAGINATOR_CURSOR:
+        return paginator.get_page(page_number)
+    return paginator.cursor_page(request.GET.get('cursor'))
@@ -0,0 +1,118 @@
+"""Проверка планов SQL-запросов страниц через EXPLAIN QUERY PLAN.
+
+Каждая страница из ``targets()`` открывается тестовым клиентом,
+её SELECT перехватываются и объясняются в SQLite. Полный проход
+таблицы считается ошибкой: на живых объёмах такая страница тормозит
+тем сильнее, чем больше данных. Полный проход — это ``SCAN таблица``
+без индекса, а в запросе без ``LIMIT`` и проход по индексу (так
+SQLite читает таблицу в порядке сортировки, не отбирая строки).
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.test import Client
+from django.urls import resolve, reverse
+
+from posts import benchmark
+from posts.models import Post
+
+# «SCAN t» и «SCAN t AS alias», но не проход по виртуальной таблице
+# или подзапросу
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(\S+)(?: AS \S+)?$')
+INDEX_SCAN = re.compile(
+    r'^SCAN (\S+)(?: AS \S+)? USING (?:COVERING )?INDEX \S+$'
+)
+
+API_VIEWS = {
+    'posts:index': 'posts:api_index',
+    'posts:group_list': 'posts:api_group_list',
+    'posts:profile': 'posts:api_profile',
+    'posts:post_detail': 'posts:api_post_detail',
+    'posts:follow_index': 'posts:api_follow_index',
+}
+
+LIMIT = re.compile(r'\sLIMIT\s', re.IGNORECASE)
+
+
+class Query(namedtuple('Query', 'sql params plan')):
+    @property
+    def limited(self):
+        return bool(LIMIT.search(self.sql))
+
+    def full_scans(self):
+        return full_scans(self.plan, self.limited)
+
+
+def targets():
+    """Страницы и их API на «тяжёлых» объектах, поиск и «Популярное»."""
+    urls = benchmark.targets()
+    for name, (url, user) in list(urls.items()):
+        kwargs = resolve(url).kwargs
+        api_url = reverse(API_VIEWS[name], kwargs=kwargs)
+        urls[API_VIEWS[name]] = (api_url, user)
+        if name == 'posts:post_detail':
+            urls['posts:api_post_comments'] = (
+                reverse('posts:api_post_comments', kwargs=kwargs), user
+            )
+    urls['posts:trending'] = (reverse('posts:trending'), None)
+    text = Post.objects.values_list('text', flat=True).first()
+    if text:
+        word = text.split()[-1]
+        urls['posts:post_search'] = (
+            f'{reverse("posts:post_search")}?q={word}', None
+        )
+    return urls
+
+
+def explain(sql, params=()):
+    """Строки плана запроса, как их печатает SQLite."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def scanned_table(detail, limited=False):
+    """Таблица, которую строка плана проходит целиком, или None."""
+    match = FULL_SCAN.match(detail) or (
+        None if limited else INDEX_SCAN.match(detail)
+    )
+    return match and match.group(1)
+
+
+def full_scans(plan, limited=False):
+    """Строки плана с полным проходом; ``limited`` — в запросе LIMIT."""
+    return [
+        detail for detail in plan if scanned_table(detail, limited)
+    ]
+
+
+def collect(url, user=None):
+    """SELECT, которые делает страница, с их планами."""
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    selects = []
+
+    def capture(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            selects.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(capture):
+        response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url}: ответ {response.status_code}')
+    return [
+        Query(sql, params, explain(sql, params)) for sql, params in selects
+    ]
+
+
+def check(urls=None):
+    """Планы запросов по view: ``{view: [Query, ...]}``."""
+    if connection.vendor != 'sqlite':
+        raise RuntimeError('EXPLAIN QUERY PLAN есть только в SQLite')
+    urls = targets() if urls is None else urls
+    return {
+        view: collect(url, user) for view, (url, user) in urls.items()
+    }
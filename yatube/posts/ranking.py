@@ -0,0 +1,192 @@
+"""«Популярное»: посты и группы по свежей активности.
+
+Каждое событие — публикация поста, комментарий, подписка на автора —
+даёт посту и его группе вес из ``TRENDING_WEIGHTS``, который затухает
+вдвое за ``TRENDING_HALF_LIFE`` секунд. Оценка в момент ``now`` —
+Σ wᵢ·e^(−(now − tᵢ)/τ), где τ = half_life / ln 2. Множитель e^(−now/τ)
+общий для всех постов и на порядок не влияет, поэтому хранится
+логарифм остального: ``score = ln Σ wᵢ·e^(tᵢ/τ)``. Новое событие
+прибавляется к оценке через log-sum-exp без пересчёта прежних, а
+затухание выходит само: у свежих событий tᵢ больше. Подписка
+засчитывается последнему посту автора — обычно подписываются,
+прочитав его.
+
+Периодическая задача ``update_trending`` читает только события после
+своих отметок (``JobCheckpoint``, по первичному ключу) и меняет оценки
+лишь затронутых постов и групп. ``TrendingPost`` и ``TrendingGroup``
+упорядочены индексом ``(-score, -id)``: страница «Популярного»
+листается по нему курсором без агрегатов по комментариям. Записи,
+затухшие ниже ``TRENDING_MIN_SCORE``, задача удаляет.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from posts import feed_cache
+from posts.models import (
+    FEED_FIELDS, Comment, Follow, JobCheckpoint, Post, TrendingGroup,
+    TrendingPost,
+)
+
+BATCH_SIZE = 1000
+CHECKPOINT = 'trending:{}'
+# начало отсчёта времени в оценках; от него оценки растут на 1
+# за каждые τ секунд, и float хватает на тысячи лет
+EPOCH = datetime(2021, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _tau():
+    return settings.TRENDING_HALF_LIFE / math.log(2)
+
+
+def log_weight(weight, moment):
+    """Вклад события с весом ``weight`` в момент ``moment``."""
+    return math.log(weight) + (moment - EPOCH).total_seconds() / _tau()
+
+
+def logaddexp(first, second):
+    """``ln(e^first + e^second)`` без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(score, now=None):
+    """Текущая оценка: сумма весов событий с учётом затухания."""
+    return math.exp(score - log_weight(1, now or timezone.now()))
+
+
+def floor(now=None):
+    """Оценка, ниже которой запись выпала из «Популярного»."""
+    return log_weight(settings.TRENDING_MIN_SCORE, now or timezone.now())
+
+
+def _posts(after):
+    rows = list(Post.objects.filter(pk__gt=after).order_by('pk').values_list(
+        'pk', 'group_id', 'pub_date'
+    )[:BATCH_SIZE])
+    return [(pk, pk, group_id, moment) for pk, group_id, moment in rows]
+
+
+def _comments(after):
+    return list(Comment.objects.filter(pk__gt=after).order_by(
+        'pk'
+    ).values_list('pk', 'post_id', 'post__group_id', 'created')[:BATCH_SIZE])
+
+
+def _follows(after):
+    rows = list(Follow.objects.filter(pk__gt=after).order_by(
+        'pk'
+    ).values_list('pk', 'author_id', 'created')[:BATCH_SIZE])
+    # последний пост каждого автора — по индексу (author, -pub_date)
+    latest = {
+        author_id: Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'group_id'
+        ).first()
+        for author_id in {author_id for _, author_id, _ in rows}
+    }
+    return [
+        (pk, *latest[author_id], moment)
+        if latest[author_id] else (pk, None, None, moment)
+        for pk, author_id, moment in rows
+    ]
+
+
+# источник событий: строки (id, пост, группа, момент) после id
+SOURCES = {
+    'post': _posts,
+    'comment': _comments,
+    'follow': _follows,
+}
+
+
+def _merge(model, deltas):
+    """Прибавляет к оценкам записей вклады ``{pk: log_weight}``."""
+    existing = model.objects.in_bulk(list(deltas))
+    for pk, entry in existing.items():
+        entry.score = logaddexp(entry.score, deltas[pk])
+    model.objects.bulk_update(
+        existing.values(), ['score'], batch_size=BATCH_SIZE
+    )
+    model.objects.bulk_create([
+        model(pk=pk, score=score)
+        for pk, score in deltas.items() if pk not in existing
+    ])
+
+
+def _apply(events, weight):
+    posts, groups = {}, {}
+    for _, post_id, group_id, moment in events:
+        if post_id is None:
+            continue
+        value = log_weight(weight, moment)
+        posts[post_id] = logaddexp(posts.get(post_id), value)
+        if group_id is not None:
+            groups[group_id] = logaddexp(groups.get(group_id), value)
+    _merge(TrendingPost, posts)
+    _merge(TrendingGroup, groups)
+
+
+def prune(now=None):
+    """Удаляет затухшие записи: их место в конце индекса."""
+    lowest = floor(now)
+    TrendingPost.objects.filter(score__lt=lowest).delete()
+    TrendingGroup.objects.filter(score__lt=lowest).delete()
+
+
+def update(now=None, progress=None):
+    """Учитывает события после отметок, возвращает их число.
+
+    Каждая пачка событий применяется вместе со сдвигом отметки
+    в одной транзакции: прерванная задача продолжит с того же места.
+    """
+    total = 0
+    for name, source in SOURCES.items():
+        weight = settings.TRENDING_WEIGHTS.get(name, 0)
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(
+            name=CHECKPOINT.format(name)
+        )
+        while True:
+            events = source(checkpoint.position)
+            if not events:
+                break
+            with transaction.atomic():
+                if weight > 0:
+                    _apply(events, weight)
+                checkpoint.position = events[-1][0]
+                checkpoint.save()
+            total += len(events)
+            if progress:
+                progress(name, total)
+    prune(now)
+    if total:
+        feed_cache.bump(feed_cache.TRENDING)
+    return total
+
+
+def rebuild(now=None, progress=None):
+    """Пересчитывает «Популярное» с нуля по всем событиям."""
+    with transaction.atomic():
+        JobCheckpoint.objects.filter(
+            name__in=[CHECKPOINT.format(name) for name in SOURCES]
+        ).delete()
+        TrendingPost.objects.all().delete()
+        TrendingGroup.objects.all().delete()
+    return update(now, progress)
+
+
+def posts():
+    """Популярные посты по убыванию оценки, с полями ленты."""
+    return TrendingPost.objects.filter(score__gte=floor()).select_related(
+        'post__author', 'post__group'
+    ).only('score', *(f'post__{field}' for field in FEED_FIELDS))
+
+
+def groups():
+    return TrendingGroup.objects.filter(score__gte=floor()).select_related(
+        'group'
+    ).only('score', 'group__title', 'group__slug')
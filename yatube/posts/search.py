@@ -0,0 +1,249 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой ``POSTS_SEARCH_BACKEND``. Основной —
+``FTS5Backend``: обратный индекс SQLite FTS5 в таблице
+``posts_post_fts`` (rowid равен id поста), который сигналы ``Post``
+держат в актуальном состоянии. ``SimpleBackend`` ищет через
+``icontains`` и годится для баз без FTS5.
+
+Результаты поиска — последовательность со ``count()`` и срезами,
+её можно передавать в ``Paginator``.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+from django.utils.text import Truncator
+
+from posts.models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+# Служебные символы вокруг совпадений в snippet(): в тексте поста
+# их не бывает, поэтому после экранирования их можно заменить на <mark>
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+SNIPPET_WORDS = 16
+
+WORD_RE = re.compile(r'\w+')
+
+# unicode61 снимает диакритику только с латиницы: «ё» приводим к «е» сами
+YO = str.maketrans('ёЁ', 'еЕ')
+
+
+def _fold(text):
+    return text.translate(YO)
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class Results:
+    """Ленивая выдача поиска: запросы выполняются при срезе."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop or self.count()) - offset
+        return self.backend.fetch(self.query, offset, max(limit, 0))
+
+
+class BaseBackend:
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+    def search(self, query):
+        return Results(self, query)
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def fetch(self, query, offset, limit):
+        raise NotImplementedError
+
+    def ids(self, query):
+        """id всех найденных постов, без загрузки самих постов."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Найденные посты из ``queryset``: поиск — подзапросом."""
+        raise NotImplementedError
+
+
+class SimpleBackend(BaseBackend):
+    """Поиск без индекса, через ``LIKE``: для баз без FTS5."""
+
+    def _queryset(self, query):
+        words = WORD_RE.findall(query)
+        if not words:
+            return Post.objects.none()
+        queryset = Post.objects.for_feed()
+        for word in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+
+    def count(self, query):
+        return self._queryset(query).count()
+
+    def fetch(self, query, offset, limit):
+        posts = list(self._queryset(query)[offset:offset + limit])
+        for post in posts:
+            post.snippet = Truncator(post.text).words(SNIPPET_WORDS)
+        return posts
+
+    def ids(self, query):
+        return list(self._queryset(query).values_list('pk', flat=True))
+
+    def filter(self, queryset, query):
+        return queryset.filter(pk__in=self._queryset(query).values('pk'))
+
+
+class FTS5Backend(BaseBackend):
+    """Обратный индекс SQLite FTS5 с ранжированием по bm25."""
+
+    @staticmethod
+    def match_expression(query):
+        """Запрос пользователя в безопасное выражение MATCH.
+
+        Каждое слово берётся в кавычки, чтобы синтаксис FTS5 в запросе
+        не ломал поиск; последнее слово ищется как префикс.
+        """
+        words = WORD_RE.findall(_fold(query))
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, text) '
+                'VALUES (%s, %s)',
+                [post.pk, _fold(post.text)],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def rebuild(self, batch_size=1000):
+        # одной транзакцией: поиск не видит индекс наполовину пустым
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            last_id = 0
+            while True:
+                rows = list(
+                    Post.objects.filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'text')[:batch_size]
+                )
+                if not rows:
+                    break
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+                    [(pk, _fold(text)) for pk, text in rows],
+                )
+                last_id = rows[-1][0]
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"
+            )
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [expression],
+            )
+            return cursor.fetchone()[0]
+
+    def ids(self, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [expression],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return queryset.none()
+        # не pk__in=RawSQL(...): Django 2.2 берёт его во вторые скобки,
+        # и SQLite сравнивает id только с первой строкой подзапроса
+        return queryset.extra(
+            where=[
+                f'{Post._meta.db_table}.id IN (SELECT rowid FROM '
+                f'{FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'
+            ],
+            params=[expression],
+        )
+
+    def fetch(self, query, offset, limit):
+        expression = self.match_expression(query)
+        if expression is None or not limit:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, '…', SNIPPET_WORDS,
+                 expression, limit, offset],
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        results = []
+        for pk, snippet in rows:
+            post = posts.get(pk)
+            if post is not None:
+                post.snippet = _highlight(snippet)
+                results.append(post)
+        return results
+
+
+@lru_cache(maxsize=None)
+def _load(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _load(settings.POSTS_SEARCH_BACKEND)
@@ -0,0 +1,385 @@
+"""Генератор синтетических данных для нагрузочных тестов.
+
+Данные похожи на живые: у авторов, групп и постов распределение
+популярности по закону Ципфа, число подписок у пользователей — с тяжёлым
+хвостом (Парето), а на кого подписываются, выбирается с весом
+популярности, поэтому у немногих авторов тысячи подписчиков,
+у большинства — единицы.
+
+Строки генерируются пачками, у каждой пачки свой генератор случайных
+чисел от ``seed``, поэтому результат не зависит от числа процессов.
+Пишется всё через ``bulk_create`` без сигналов, а счётчики, ленты
+и поисковый индекс пересобираются в конце.
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import uuid
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+from itertools import accumulate
+from math import gcd
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import override_settings
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from posts import counters, feed, search
+from posts.models import Comment, Follow, Group, Post, User
+
+CHUNK_SIZE = 10000
+
+Scale = namedtuple('Scale', 'users groups posts comments follows')
+Scale.__doc__ = (
+    'Объём данных; follows — среднее число подписок на пользователя.'
+)
+
+# Поля, в порядке которых генераторы пачек отдают строки: кортежи
+# передаются между процессами намного быстрее объектов моделей
+FIELDS = {
+    User: ('id', 'username', 'first_name', 'last_name', 'password'),
+    Group: ('id', 'title', 'slug', 'description'),
+    Post: ('id', 'text', 'pub_date', 'author_id', 'group_id', 'image'),
+    Comment: ('post_id', 'author_id', 'text', 'created'),
+    Follow: ('user_id', 'author_id'),
+}
+
+# Всё, что нужно воркеру, чтобы сгенерировать любую пачку строк
+Plan = namedtuple('Plan', (
+    'scale seed prefix days now password images image_ratio '
+    'user_base group_base post_base'
+))
+
+IMAGES_DIR = 'posts/seed'
+
+WORDS = (
+    'утро город река лес дорога дом окно кот собака книга музыка кофе '
+    'поезд море небо солнце дождь снег ветер друг встреча работа отпуск '
+    'фото прогулка парк мост улица вечер ночь история идея проект код '
+    'тест релиз ошибка исправление лента подписка группа пост новость '
+    'горы озеро поле сад цветы осень весна лето зима праздник'
+).split()
+
+
+@lru_cache(maxsize=8)
+def _weights(count, exponent=1.0):
+    """Накопленные веса Ципфа: первый в 2**exponent раз чаще второго."""
+    return array('d', accumulate(
+        1 / (rank ** exponent) for rank in range(1, count + 1)
+    ))
+
+
+@lru_cache(maxsize=8)
+def _step(count, salt):
+    """Шаг перестановки ``rank -> (rank * step + salt) % count``."""
+    step = count // 2 + 1 + salt % max(count, 1)
+    while gcd(step, count) != 1:
+        step += 1
+    return step
+
+
+def _popular(rng, count, salt, exponent=1.0):
+    """Индекс от 0 до ``count``: популярные выпадают чаще.
+
+    Ранг популярности перемешивается, чтобы самые популярные
+    не совпадали с первыми по id.
+    """
+    rank = rng.choices(
+        range(count), cum_weights=_weights(count, exponent)
+    )[0]
+    return (rank * _step(count, salt) + salt) % count
+
+
+def _text(rng, low=5, high=60):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def _rng(plan, kind, chunk):
+    return random.Random(f'{plan.seed}:{kind}:{chunk}')
+
+
+def _bounds(total, chunk, size=CHUNK_SIZE):
+    return range(chunk * size, min((chunk + 1) * size, total))
+
+
+def _post_date(plan, index, jitter=0.0):
+    """Даты постов растут вместе с номером поста."""
+    share = (index + jitter) / max(plan.scale.posts, 1)
+    return plan.now - timedelta(days=plan.days * (1 - share))
+
+
+def user_rows(plan, chunk):
+    rng = _rng(plan, 'users', chunk)
+    return [
+        (
+            plan.user_base + i,
+            f'{plan.prefix}{i}',
+            rng.choice(WORDS).capitalize(),
+            rng.choice(WORDS).capitalize(),
+            plan.password,
+        )
+        for i in _bounds(plan.scale.users, chunk)
+    ]
+
+
+def group_rows(plan, chunk):
+    rng = _rng(plan, 'groups', chunk)
+    return [
+        (
+            plan.group_base + i,
+            f'Группа {plan.prefix}{i}',
+            f'{plan.prefix}-group-{i}',
+            _text(rng, 3, 20),
+        )
+        for i in _bounds(plan.scale.groups, chunk)
+    ]
+
+
+def post_rows(plan, chunk):
+    rng = _rng(plan, 'posts', chunk)
+    scale = plan.scale
+    rows = []
+    for i in _bounds(scale.posts, chunk):
+        group_id = None
+        if scale.groups and rng.random() < 0.7:
+            group_id = plan.group_base + _popular(rng, scale.groups, 0)
+        image = ''
+        if plan.images and rng.random() < plan.image_ratio:
+            image = rng.choice(plan.images)
+        rows.append((
+            plan.post_base + i,
+            _text(rng),
+            _post_date(plan, i, rng.random()),
+            plan.user_base + _popular(rng, scale.users, 1),
+            group_id,
+            image,
+        ))
+    return rows
+
+
+def comment_rows(plan, chunk):
+    rng = _rng(plan, 'comments', chunk)
+    scale = plan.scale
+    rows = []
+    for _ in _bounds(scale.comments, chunk):
+        index = _popular(rng, scale.posts, 2)
+        created = _post_date(plan, index + 1) + timedelta(
+            hours=rng.random() * 72
+        )
+        rows.append((
+            plan.post_base + index,
+            plan.user_base + rng.randrange(scale.users),
+            _text(rng, 1, 20),
+            min(created, plan.now),
+        ))
+    return rows
+
+
+def follow_rows(plan, chunk):
+    """Подписки пачки пользователей: число — Парето, цели — по Ципфу."""
+    rng = _rng(plan, 'follows', chunk)
+    users = plan.scale.users
+    mean = plan.scale.follows
+    rows = []
+    for user in _bounds(users, chunk, _follow_chunk(plan)):
+        # у Парето с alpha=1.5 среднее равно 3
+        degree = min(int(rng.paretovariate(1.5) * mean / 3), users - 1)
+        targets = set()
+        attempts = degree * 3
+        while len(targets) < degree and attempts:
+            attempts -= 1
+            author = _popular(rng, users, 1, exponent=0.8)
+            if author != user:
+                targets.add(author)
+        rows.extend(
+            (plan.user_base + user, plan.user_base + author)
+            for author in sorted(targets)
+        )
+    return rows
+
+
+def _follow_chunk(plan):
+    return max(CHUNK_SIZE // max(plan.scale.follows, 1), 1)
+
+
+def _chunks(total, size=CHUNK_SIZE):
+    return range((total + size - 1) // size)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Даёт записать свои даты в поля с ``auto_now_add``."""
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+@contextmanager
+def _pool(processes):
+    """``map`` по пачкам: в процессах или, при одном, на месте."""
+    if processes <= 1:
+        yield map
+        return
+    # spawn: воркеры не наследуют открытые соединения с базой
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=django.setup) as pool:
+        yield lambda function, chunks: pool.imap(function, chunks)
+
+
+def prepare_images(count, seed=0):
+    """Кладёт в хранилище ``count`` картинок-градиентов, если их нет."""
+    rng = random.Random(f'{seed}:images')
+    names = []
+    for i in range(count):
+        name = f'{IMAGES_DIR}/{i}.jpg'
+        colors = [
+            tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)
+        ]
+        if not default_storage.exists(name):
+            gradient = Image.linear_gradient('L').resize((960, 640))
+            buffer = BytesIO()
+            ImageOps.colorize(gradient, *colors).save(
+                buffer, 'JPEG', quality=85
+            )
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return tuple(names)
+
+
+def generate(scale, seed=0, prefix='user', days=365, processes=1,
+             images=0, image_ratio=0.3, password=None, progress=None):
+    """Наполняет базу данными объёма ``scale``.
+
+    Одинаковые ``scale`` и ``seed`` дают одинаковые данные при любом
+    ``processes``. ``images`` — сколько картинок заготовить для постов,
+    ``password`` — общий пароль пользователей (по умолчанию войти
+    нельзя). Возвращает число созданных строк по моделям.
+    """
+    plan = Plan(
+        scale=scale, seed=seed, prefix=prefix, days=days,
+        # от полуночи: в течение дня одинаковый seed даёт те же даты
+        now=timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ),
+        password=make_password(password),
+        images=prepare_images(images, seed) if images else (),
+        image_ratio=image_ratio,
+        user_base=_next_id(User),
+        group_base=_next_id(Group),
+        post_base=_next_id(Post),
+    )
+    steps = (
+        (User, user_rows, _chunks(scale.users)),
+        (Group, group_rows, _chunks(scale.groups)),
+        (Post, post_rows, _chunks(scale.posts)),
+        (Comment, comment_rows,
+         _chunks(scale.comments) if scale.posts else ()),
+        (Follow, follow_rows,
+         _chunks(scale.users, _follow_chunk(plan)) if scale.users > 1
+         else ()),
+    )
+    created = {}
+    with _pool(processes) as pool_map, explicit_dates(
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ):
+        for model, rows, chunks in steps:
+            total = 0
+            fields = FIELDS[model]
+            for batch in pool_map(_Job(rows, plan), chunks):
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        model(**dict(zip(fields, row))) for row in batch
+                    )
+                total += len(batch)
+                if progress:
+                    progress(model, total)
+            created[f'{model._meta.model_name}s'] = total
+    reset_sequences(User, Group, Post)
+    finish()
+    return created
+
+
+class _Job:
+    """Пачка строк по номеру; объект передаётся в процессы пула."""
+
+    def __init__(self, rows, plan):
+        self.rows = rows
+        self.plan = plan
+
+    def __call__(self, chunk):
+        return self.rows(self.plan, chunk)
+
+
+def reset_sequences(*models):
+    # после вставки с явными id последовательности нужно догнать
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def finish():
+    """Пересчитывает то, что обычно поддерживают сигналы."""
+    counters.recount()
+    if feed.is_materialized():
+        feed.rebuild()
+    search.get_backend().rebuild()
+
+
+@contextmanager
+def temporary_database(scale, seed=0):
+    """Временная база в файле с данными ``scale`` на время блока.
+
+    База в файле, а не в памяти, чтобы её видели все потоки; у кэша
+    свой префикс, чтобы не задеть кэш сайта.
+    """
+    directory = tempfile.mkdtemp()
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    # имя меняется на время блока: от него зависят и тестовые базы,
+    # которые процесс создаст потом
+    previous_name = test_settings.get('NAME')
+    test_settings['NAME'] = os.path.join(directory, 'seeded.sqlite3')
+    prefix = f'seeded-{uuid.uuid4().hex}'
+    cache_settings = {
+        alias: {**config, 'KEY_PREFIX': prefix}
+        for alias, config in settings.CACHES.items()
+    }
+    # create_test_db возвращает имя новой базы, прежнее нужно запомнить
+    old_name = connection.settings_dict['NAME']
+    try:
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(CACHES=cache_settings):
+                generate(scale, seed=seed)
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = previous_name
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,166 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from posts import counters, feed, feed_cache, recommendations, search
+from posts.models import Comment, Follow, Group, Post
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, raw, **kwargs):
+    # группу до правки нужно знать, чтобы сбросить и её ленту
+    instance._previous_group_id = None
+    if instance.pk and not raw:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', flat=True).first()
+
+
+def _bump(*feeds):
+    # поколение сдвигается после фиксации: иначе параллельный запрос
+    # успеет закэшировать прежние строки уже под новым поколением
+    transaction.on_commit(partial(feed_cache.bump, *feeds))
+
+
+def _refresh_post_pages(post_id, author_id, *group_ids):
+    """Сдвигает поколения ленты поста и пересобирает первые страницы
+    его групп — в этом порядке, иначе сборка уйдёт под старое
+    поколение."""
+    group_ids = {group_id for group_id in group_ids if group_id}
+    feeds = [
+        feed_cache.post_page(post_id),
+        *feed_cache.post_feeds(author_id, *group_ids),
+    ]
+    if group_ids:
+        feeds.append(feed_cache.GROUPS)
+
+    def refresh():
+        feed_cache.bump(*feeds)
+        for group_id in group_ids:
+            feed_cache.first_page(
+                feed_cache.group_feed(group_id),
+                Post.objects.filter(group_id=group_id).for_feed(),
+            )
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    _refresh_post_pages(
+        instance.pk, instance.author_id, instance.group_id, previous_group_id
+    )
+    search.get_backend().index(instance)
+    if created or previous_group_id != instance.group_id:
+        if previous_group_id:
+            counters.group_post_removed(previous_group_id)
+        if instance.group_id:
+            counters.group_post_added(
+                instance.group_id, None if created else instance.pk
+            )
+    if not created:
+        return
+    counters.change_user(instance.author_id, posts_count=1)
+    if feed.is_materialized():
+        feed.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _refresh_post_pages(instance.pk, instance.author_id, instance.group_id)
+    counters.change_user(instance.author_id, create=False, posts_count=-1)
+    if instance.group_id:
+        counters.group_post_removed(instance.group_id)
+    search.get_backend().remove(instance.pk)
+
+
+def _group_feeds(group_id):
+    # название и адрес группы есть в карточках её постов во всех лентах;
+    # страницы постов и профили зависят от поколения ленты автора
+    authors = Post.objects.filter(group_id=group_id).order_by().values_list(
+        'author_id', flat=True
+    ).distinct()
+    return (
+        feed_cache.GROUPS, feed_cache.group_feed(group_id),
+        feed_cache.INDEX, feed_cache.TRENDING,
+        *(feed_cache.author_feed(author_id) for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        _bump(feed_cache.GROUPS)
+        return
+    _bump(*_group_feeds(instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # после удаления посты уже без группы: авторов ищем заранее
+    _bump(*_group_feeds(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    pages = [feed_cache.post_page(instance.post_id)]
+    if created:
+        counters.change_post(instance.post_id, 1)
+        group_id = instance.post.group_id
+        if group_id:
+            counters.group_activity(group_id, instance.created)
+            pages.append(feed_cache.GROUPS)
+    _bump(*pages)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+    _bump(feed_cache.post_page(instance.post_id))
+
+
+def _follow_pages(follow):
+    # у обоих меняются счётчики в профиле, у читателя — лента подписок
+    return (
+        feed_cache.follow_feed(follow.user_id),
+        feed_cache.profile_page(follow.user_id),
+        feed_cache.profile_page(follow.author_id),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if raw or not created:
+        return
+    _bump(*_follow_pages(instance))
+    recommendations.mark_stale([instance.user_id])
+    with transaction.atomic():
+        counters.change_user(instance.user_id, following_count=1)
+        counters.change_user(instance.author_id, followers_count=1)
+    if feed.is_materialized():
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    _bump(*_follow_pages(instance))
+    recommendations.mark_stale([instance.user_id])
+    with transaction.atomic():
+        counters.change_user(
+            instance.user_id, create=False, following_count=-1
+        )
+        counters.change_user(
+            instance.author_id, create=False, followers_count=-1
+        )
+    if feed.is_materialized():
+        feed.prune(instance.user_id, instance.author_id)
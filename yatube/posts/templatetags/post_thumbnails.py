@@ -0,0 +1,12 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра, а пока её режут в фоне — оригинал."""
+    thumbnail = thumbnails.ready_or_enqueue(image, geometry, **options)
+    return thumbnail or image
@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.utils import OnCommitMixin
+
+
+class ApiTest(OnCommitMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        for i in range(12):
+            cls.post = Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Ленты отдаются JSON-страницами с курсором"""
+        for url in (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.author.username,)),
+            reverse('posts:api_follow_index'),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(data['results'][0]['id'], self.post.id)
+                self.assertEqual(
+                    data['results'][0]['group']['slug'], self.group.slug
+                )
+                data = self.client.get(
+                    url, {'cursor': data['next_cursor']}
+                ).json()
+                self.assertEqual(len(data['results']), 2)
+                self.assertIsNone(data['next_cursor'])
+
+    def test_post_and_comments(self):
+        """Пост и комментарии к нему"""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент'
+        )
+        data = self.client.get(
+            reverse('posts:api_post_detail', args=(self.post.id,))
+        ).json()
+        self.assertEqual(data['author']['username'], 'author')
+        self.assertEqual(data['comments_count'], 1)
+        data = self.client.get(
+            reverse('posts:api_post_comments', args=(self.post.id,))
+        ).json()
+        self.assertEqual(data['results'][0]['text'], 'Коммент')
+        response = self.client.get(
+            reverse('posts:api_post_detail', args=(10 ** 6,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag получает 304, пока лента не менялась"""
+        url = reverse('posts:api_group_list', args=(self.group.slug,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('public', response['Cache-Control'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text='Новый', author=self.author, group=self.group
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый')
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag поста"""
+        url = reverse('posts:api_post_comments', args=(self.post.id,))
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='К'
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_follow_feed(self):
+        """Лента подписок: только для вошедших, ETag личный"""
+        url = reverse('posts:api_follow_index')
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        etag = response['ETag']
+        Follow.objects.filter(user=self.reader).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'], [])
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 401)
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.test import LiveServerTestCase, TestCase
+from django.urls import reverse
+
+from posts import benchmark, seeding
+from posts.models import Comment, Group, Post, User
+
+
+class BenchmarkTest(TestCase):
+    def test_run_and_compare(self):
+        """Прогон отдаёт перцентили и число запросов по каждому view"""
+        seeding.generate(
+            seeding.Scale(users=20, groups=2, posts=50, comments=50,
+                          follows=5),
+            seed=0,
+        )
+        cache.clear()
+        report = benchmark.run(
+            benchmark.ClientDriver(), requests=3, concurrency=1
+        )
+        self.assertIn('posts:index', report)
+        self.assertIn('posts:follow_index', report)
+        for stats in report.values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertGreater(stats['queries'], 0)
+
+        baseline = {'posts:index': dict(report['posts:index'])}
+        self.assertEqual(benchmark.compare(report, baseline, 0.5), [])
+        baseline['posts:index']['queries'] -= 1
+        self.assertEqual(len(benchmark.compare(report, baseline, 0.5)), 1)
+
+
+class HttpDriverTest(LiveServerTestCase):
+    def test_targets_from_server(self):
+        """Адреса для HTTP-прогона берутся из базы сервера"""
+        author = User.objects.create(username='server_author')
+        group = Group.objects.create(title='Группа', slug='server-group')
+        post = Post.objects.create(text='Пост', author=author, group=group)
+        Comment.objects.create(post=post, author=author, text='Коммент')
+        Post.objects.create(text='Без группы', author=author)
+        driver = benchmark.HttpDriver(self.live_server_url)
+        targets = driver.targets()
+        self.assertEqual(
+            targets['posts:post_detail'][0],
+            reverse('posts:post_detail', args=(post.id,)),
+        )
+        self.assertEqual(
+            targets['posts:group_list'][0],
+            reverse('posts:group_list', args=(group.slug,)),
+        )
+        self.assertNotIn('posts:follow_index', targets)
+        report = benchmark.run(driver, requests=2, concurrency=1)
+        self.assertEqual(set(report), set(targets))
@@ -0,0 +1,70 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts import dataset
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class DatasetTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        group = Group.objects.create(title='Группа', slug='group')
+        post = Post.objects.create(text='Пост', author=author, group=group)
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        Follow.objects.create(user=reader, author=author)
+
+    def dump(self):
+        stream = io.StringIO()
+        dataset.export(stream)
+        return stream.getvalue()
+
+    def test_round_trip(self):
+        """Выгрузка загружается обратно с теми же id и датами"""
+        path = os.path.join(self.directory, 'dump.ndjson.gz')
+        call_command('export_dataset', path, stdout=io.StringIO())
+        before = self.dump()
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+
+        call_command('import_dataset', path, stdout=io.StringIO())
+        self.assertEqual(self.dump(), before)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(reader.stats.following_count, 1)
+        self.assertEqual(Post.objects.get().comments_count, 1)
+        # последовательности догнали загруженные id
+        self.assertGreater(
+            User.objects.create(username='new').pk, reader.pk
+        )
+
+    def test_conflicts_and_garbage(self):
+        """Конфликт id и чужой файл — понятные ошибки"""
+        path = os.path.join(self.directory, 'dump.ndjson')
+        call_command('export_dataset', path, stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'конфликтуют'):
+            call_command('import_dataset', path, stdout=io.StringIO())
+        with open(path, 'w') as file:
+            file.write('[]\n')
+        with self.assertRaisesMessage(CommandError, 'не выгрузка'):
+            call_command('import_dataset', path, stdout=io.StringIO())
+
+    def test_unknown_field(self):
+        """Лишнее поле в записи — ошибка с номером строки"""
+        lines = self.dump().splitlines()
+        lines[2] = lines[2].replace('"fields": {', '"fields": {"karma": 1, ')
+        with self.assertRaisesMessage(
+            dataset.DatasetError, 'Строка 3: у auth.user нет полей karma'
+        ):
+            dataset.load(io.StringIO('\n'.join(lines)))
+        with self.assertRaisesMessage(
+            dataset.DatasetError, 'Строка 2: нужны'
+        ):
+            dataset.load(io.StringIO(lines[0] + '\n{"model": "posts.group"}'))
@@ -0,0 +1,204 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import counters, feed, follows
+from posts.models import FeedEntry, Follow, Post, User, UserStats
+from posts.tests.utils import QueryCountMixin
+
+
+class BulkFollowTest(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(username='reader')
+        cls.authors = [
+            User.objects.create(username=f'author_{i}') for i in range(30)
+        ]
+        for author in cls.authors[:3]:
+            Post.objects.create(text='Пост', author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def pairs(self, authors):
+        return [(self.reader.pk, author.pk) for author in authors]
+
+    def assertCountersExact(self):
+        stats = {
+            row['user_id']: row for row in UserStats.objects.values()
+        }
+        counters.recount()
+        self.assertEqual(
+            {
+                row['user_id']: row for row in UserStats.objects.filter(
+                    user_id__in=stats
+                ).values()
+            },
+            stats,
+        )
+
+    def test_follow(self):
+        """Новые подписки создаются, повторы и подписка на себя — нет"""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        created = follows.follow(
+            self.pairs(self.authors[:5]) + [(self.reader.pk,) * 2]
+        )
+        self.assertEqual(created, set(self.pairs(self.authors[1:5])))
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 5
+        )
+        self.assertEqual(self.reader.stats.following_count, 5)
+        self.assertCountersExact()
+
+    def test_queries_do_not_grow(self):
+        """Число запросов не зависит от числа авторов"""
+        with self.assertMaxQueries(10) as few:
+            follows.follow(self.pairs(self.authors[:2]))
+        with self.assertMaxQueries(len(few.captured_queries)):
+            follows.follow(self.pairs(self.authors[2:]))
+
+    def test_unfollow(self):
+        follows.follow(self.pairs(self.authors[:5]))
+        removed = follows.unfollow(
+            self.reader.pk, [author.pk for author in self.authors[3:10]]
+        )
+        self.assertEqual(removed, {author.pk for author in self.authors[3:5]})
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertCountersExact()
+
+    @override_settings(FOLLOW_FEED_STRATEGY='write')
+    def test_materialized_feed(self):
+        """Материализованная лента пополняется и чистится пачкой"""
+        follows.follow(self.pairs(self.authors[:5]))
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 3)
+        follows.unfollow(self.reader.pk, [self.authors[0].pk])
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+        feed.rebuild()
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_follow_many_view(self):
+        response = self.client.post(
+            reverse('posts:follow_many'),
+            {'authors': ['author_1, author_2', 'author_3 nobody']},
+        )
+        self.assertRedirects(response, reverse('posts:follow_index'))
+        self.assertEqual(
+            set(Follow.objects.values_list('author__username', flat=True)),
+            {'author_1', 'author_2', 'author_3'},
+        )
+
+    @override_settings(FOLLOW_BULK_LIMIT=2)
+    def test_follow_many_limit(self):
+        response = self.client.post(
+            reverse('posts:follow_many'),
+            {'authors': 'author_1 author_2 author_3'},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_follow_many_requires_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        response = client.post(
+            reverse('posts:follow_many'), {'authors': 'author_1'}
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_api_requires_csrf(self):
+        """Подписка через API проверяет CSRF-токен"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.reader)
+        url = reverse('posts:api_follow_authors')
+        body = json.dumps({'authors': ['author_1']})
+        response = client.post(url, body, 'application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Follow.objects.exists())
+        token = 'a' * 32
+        client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = client.post(
+            url, body, 'application/json', HTTP_X_CSRFTOKEN=token
+        )
+        self.assertEqual(response.json()['changed'], ['author_1'])
+
+    def test_api_requires_json(self):
+        response = self.client.post(
+            reverse('posts:api_follow_authors'), {'authors': 'author_1'}
+        )
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_api(self):
+        """API подписывает и отписывает пачкой"""
+        url = reverse('posts:api_follow_authors')
+        body = json.dumps({'authors': ['author_1', 'author_2', 'nobody']})
+        response = self.client.post(url, body, 'application/json')
+        self.assertEqual(response.json(), {
+            'changed': ['author_1', 'author_2'], 'unknown': ['nobody'],
+        })
+        response = self.client.post(url, body, 'application/json')
+        self.assertEqual(response.json()['changed'], [])
+        response = self.client.delete(url, body, 'application/json')
+        self.assertEqual(response.json()['changed'], ['author_1', 'author_2'])
+        self.assertFalse(Follow.objects.exists())
+        response = self.client.post(url, '[]', 'application/json')
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        response = self.client.post(url, body, 'application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+class ImportFollowsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'follows.csv')
+        self.users = [
+            User.objects.create(username=f'user_{i}') for i in range(4)
+        ]
+
+    def load(self, text, *args):
+        with open(self.path, 'w') as stream:
+            stream.write(text)
+        call_command(
+            'import_follows', self.path, '--batch-size', '2', *args,
+            stdout=StringIO(),
+        )
+
+    def test_usernames(self):
+        """Подписки грузятся пачками, неизвестные имена пропускаются"""
+        self.load(
+            'user,author\n'
+            'user_0,user_1\nuser_0,user_2\nuser_1,user_2\n'
+            'user_0,nobody\nuser_0,user_1\n'
+        )
+        self.assertEqual(
+            set(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            {('user_0', 'user_1'), ('user_0', 'user_2'),
+             ('user_1', 'user_2')},
+        )
+        self.assertEqual(self.users[2].stats.followers_count, 2)
+
+    def test_ids(self):
+        self.load(
+            f'{self.users[3].pk},{self.users[0].pk}\n'
+            f'{self.users[3].pk},{self.users[3].pk + 100}\n',
+            '--ids',
+        )
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(self.users[3].pk, self.users[0].pk)],
+        )
@@ -1,10 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
+
+from PIL import Image
 from django.test import TestCase, Client, override_settings
+from posts.images import ORIENTATION
 from posts.models import Post, Group, Comment
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.utils import timezone
 
@@ -13,7 +18,7 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
 class PostFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -133,6 +138,67 @@ class PostFormsTests(TestCase):
         self.assertEqual(edit_post.group, self.group)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
+class PostImageUploadTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_author = Client()
+        self.authorized_author.force_login(self.author)
+
+    def upload(self, name, size, fmt, **save_params):
+        buffer = BytesIO()
+        Image.new('RGB', size, (200, 10, 10)).save(
+            buffer, fmt, **save_params
+        )
+        image = SimpleUploadedFile(name, buffer.getvalue())
+        return self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': name, 'image': image},
+        )
+
+    def test_large_photo_is_downscaled_and_rotated(self):
+        """Крупное фото поворачивается по EXIF и уменьшается без EXIF"""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        self.upload('photo.jpg', (3000, 2000), 'JPEG', exif=exif.tobytes())
+        post = Post.objects.get(text='photo.jpg')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (1280, 1920))
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertNotIn('exif', stored.info)
+
+    def test_non_web_format_is_reencoded(self):
+        self.upload('scan.bmp', (10, 10), 'BMP')
+        post = Post.objects.get(text='scan.bmp')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_decompression_bomb_rejected(self):
+        """Картинка больше IMAGE_MAX_PIXELS точек не принимается"""
+        response = self.upload('bomb.png', (20, 20), 'PNG')
+        self.assertFalse(Post.objects.filter(text='bomb.png').exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Изображение слишком большое: 20×20 точек.'
+        )
+
+    @override_settings(IMAGE_KEEP_ORIGINAL=True)
+    def test_original_kept_when_enabled(self):
+        self.upload('big.png', (2000, 10), 'PNG')
+        self.assertTrue(
+            default_storage.exists('posts/originals/big.png')
+        )
+
+
 class CommentFormTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,140 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import counters
+from posts.models import Comment, Group, GroupStats, Post, User
+from posts.tests.utils import OnCommitMixin, QueryCountMixin
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.first = Group.objects.create(title='Первая', slug='first')
+        cls.second = Group.objects.create(title='Вторая', slug='second')
+
+    def stats(self, group, *fields):
+        return GroupStats.objects.values(
+            'posts_count', 'last_post', *fields
+        ).get(group=group)
+
+    def assertStatsExact(self):
+        stats = {
+            group: self.stats(group, 'last_activity')
+            for group in (self.first, self.second)
+        }
+        for group in (self.first, self.second):
+            counters.recount_group(group.id)
+            self.assertEqual(self.stats(group, 'last_activity'), stats[group])
+
+    def test_signals(self):
+        """Сигналы постов ведут счётчики так же, как пересчёт"""
+        posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=self.author, group=self.first
+            )
+            for i in range(3)
+        ]
+        Post.objects.create(text='Без группы', author=self.author)
+        self.assertEqual(self.stats(self.first)['posts_count'], 3)
+        self.assertEqual(self.stats(self.first)['last_post'], posts[-1].id)
+
+        posts[-1].group = self.second
+        posts[-1].save()
+        self.assertStatsExact()
+        self.assertEqual(self.stats(self.first)['last_post'], posts[1].id)
+
+        posts[1].delete()
+        self.assertStatsExact()
+        self.assertEqual(self.stats(self.first)['posts_count'], 1)
+
+        comment = Comment.objects.create(
+            post=posts[0], author=self.author, text='Комментарий'
+        )
+        self.assertEqual(
+            self.stats(self.first, 'last_activity')['last_activity'],
+            comment.created,
+        )
+
+        posts[0].group = self.second
+        posts[0].save()
+        self.assertStatsExact()
+        self.assertIsNone(
+            self.stats(self.first, 'last_activity')['last_activity']
+        )
+        self.assertEqual(
+            self.stats(self.second, 'last_activity')['last_activity'],
+            comment.created,
+        )
+
+
+class GroupPagesTest(OnCommitMixin, QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        for i in range(5):
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}'
+            )
+            Post.objects.create(
+                text=f'Пост в группе {i}', author=cls.author, group=group
+            )
+        Group.objects.create(title='Пустая', slug='empty')
+        cls.group = group
+
+    def setUp(self):
+        cache.clear()
+
+    def test_directory(self):
+        """Каталог групп — один запрос при любом числе групп"""
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('posts:group_index'))
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertContains(response, 'Пост в группе 4')
+        self.assertContains(response, 'Постов: 0')
+
+    @override_settings(ANONYMOUS_PAGE_CACHE=True)
+    def test_group_edit_refreshes_pages(self):
+        """Правка группы сразу видна в каталоге и в её ленте"""
+        urls = (
+            reverse('posts:group_index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.group.title = 'Новое название'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое название')
+
+    def test_slug_rename_refreshes_feeds(self):
+        """Новый адрес группы сразу виден в карточках постов на главной"""
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), 'group/group-4/')
+        self.group.slug = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'group/renamed/')
+        self.assertNotContains(response, 'group/group-4/')
+
+    def test_first_page_cached(self):
+        """Первая страница ленты группы берётся из кэша до новой записи"""
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                text='Новый пост', author=self.author, group=self.group
+            )
+        # страницу собрали после записи, уже под новым поколением
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Новый пост'
+        )
@@ -1,6 +1,9 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
-from posts.models import Group, Post, Comment
+from posts.models import Group, Post, Comment, Follow, UserStats
 from django.utils import timezone
 
 User = get_user_model()
@@ -90,3 +93,51 @@ class CommentModelTest(TestCase):
                 self.assertEqual(
                     str(comment), expected
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов"""
+        post = Post.objects.create(author=self.author, text='text')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='comment'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """recount_stats восстанавливает счётчики по таблицам"""
+        post = Post.objects.create(author=self.author, text='text')
+        Comment.objects.create(post=post, author=self.reader, text='c')
+        UserStats.objects.update(posts_count=42, following_count=7)
+        Post.objects.update(comments_count=0)
+        UserStats.objects.filter(user=self.reader).delete()
+
+        call_command('recount_stats', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts import query_plans, seeding
+from posts.models import Post
+
+
+class QueryPlansTest(TestCase):
+    SCALE = seeding.Scale(
+        users=30, groups=3, posts=200, comments=300, follows=5
+    )
+
+    def test_full_scan_detection(self):
+        """Полным проходом считается только SCAN без индекса"""
+        plan = [
+            'SCAN posts_post',
+            'SCAN posts_post AS U0',
+            'SCAN posts_post USING INDEX posts_post_pub_date',
+            'SCAN posts_post_fts VIRTUAL TABLE INDEX 0:M1',
+            'SCAN CONSTANT ROW',
+            'SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)',
+        ]
+        self.assertEqual(
+            query_plans.full_scans(plan, limited=True),
+            ['SCAN posts_post', 'SCAN posts_post AS U0'],
+        )
+        # без LIMIT проход по индексу читает всю таблицу
+        self.assertEqual(len(query_plans.full_scans(plan)), 3)
+
+    def test_explain(self):
+        """План запроса берётся у SQLite"""
+        for queryset in (
+            Post.objects.filter(text='Пост').order_by(),
+            Post.objects.filter(text='Пост'),
+        ):
+            sql, params = queryset.query.sql_with_params()
+            query = query_plans.Query(
+                sql, params, query_plans.explain(sql, params)
+            )
+            with self.subTest(sql=sql):
+                self.assertTrue(query.full_scans())
+        sql, params = Post.objects.all()[:10].query.sql_with_params()
+        query = query_plans.Query(
+            sql, params, query_plans.explain(sql, params)
+        )
+        self.assertEqual(query.full_scans(), [])
+
+    def test_views_use_indexes(self):
+        """Страницы и API не проходят таблицы целиком"""
+        seeding.generate(self.SCALE, seed=3)
+        cache.clear()
+        views = query_plans.check()
+        self.assertIn('posts:api_post_comments', views)
+        for view, queries in views.items():
+            for query in queries:
+                with self.subTest(view=view, sql=query.sql):
+                    self.assertEqual(query.full_scans(), [])
@@ -0,0 +1,134 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import ranking
+from posts.models import (
+    Comment, Follow, Group, JobCheckpoint, Post, TrendingGroup,
+    TrendingPost, User,
+)
+from posts.tests.utils import QueryCountMixin
+
+
+@override_settings(TRENDING_HALF_LIFE=3600)
+class DecayTest(SimpleTestCase):
+    def test_decay(self):
+        """Вес события затухает вдвое за полупериод"""
+        now = timezone.now()
+        score = ranking.logaddexp(
+            ranking.log_weight(1, now), ranking.log_weight(1, now)
+        )
+        self.assertAlmostEqual(ranking.decayed(score, now), 2)
+        self.assertAlmostEqual(
+            ranking.decayed(score, now + timedelta(hours=1)), 1
+        )
+        # свежий вес 1 перевешивает двойной вес двухчасовой давности
+        self.assertGreater(
+            ranking.log_weight(1, now),
+            ranking.log_weight(2, now - timedelta(hours=2)) + 0.1,
+        )
+
+
+class TrendingTest(QueryCountMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, post, count=1):
+        for _ in range(count):
+            Comment.objects.create(
+                post=post, author=self.reader, text='Комментарий'
+            )
+
+    def ranked(self):
+        return list(TrendingPost.objects.values_list('post_id', flat=True))
+
+    def test_incremental_update(self):
+        """Задача трогает только посты с новыми событиями"""
+        self.comment(self.posts[0], 3)
+        self.comment(self.posts[1])
+        self.assertEqual(ranking.update(), 7)
+        self.assertEqual(self.ranked()[:2], [
+            self.posts[0].id, self.posts[1].id
+        ])
+        scores = dict(TrendingPost.objects.values_list('post_id', 'score'))
+        self.assertEqual(ranking.update(), 0)
+
+        self.comment(self.posts[2], 4)
+        with self.assertMaxQueries(20):
+            self.assertEqual(ranking.update(), 4)
+        self.assertEqual(self.ranked()[0], self.posts[2].id)
+        self.assertEqual(
+            TrendingPost.objects.get(post=self.posts[0]).score,
+            scores[self.posts[0].id],
+        )
+        self.assertEqual(
+            JobCheckpoint.objects.get(name='trending:comment').position,
+            Comment.objects.latest('id').id,
+        )
+        self.assertTrue(TrendingGroup.objects.filter(group=self.group))
+        rebuilt = dict(TrendingPost.objects.values_list('post_id', 'score'))
+        ranking.rebuild()
+        for post_id, score in TrendingPost.objects.values_list(
+            'post_id', 'score'
+        ):
+            self.assertAlmostEqual(score, rebuilt[post_id])
+
+    def test_follow_counts_for_latest_post(self):
+        ranking.update()
+        Follow.objects.create(user=self.reader, author=self.author)
+        ranking.update()
+        self.assertEqual(self.ranked()[0], self.posts[-1].id)
+
+    @override_settings(TRENDING_HALF_LIFE=3600)
+    def test_prune(self):
+        """Затухшие записи удаляются"""
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date=timezone.now() - timedelta(days=2)
+        )
+        call_command('update_trending', stdout=StringIO())
+        self.assertNotIn(self.posts[0].id, self.ranked())
+        self.assertEqual(len(self.ranked()), 2)
+
+    def test_view(self):
+        """Страница листается курсором по оценке, без агрегатов"""
+        self.comment(self.posts[0], 2)
+        ranking.update()
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.ranked(),
+        )
+        self.assertContains(response, 'Популярные группы')
+
+    @override_settings(PAGINATOR_PAGES=2)
+    def test_keyset_pages(self):
+        ranking.update()
+        response = self.client.get(reverse('posts:trending'))
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(
+            reverse('posts:trending'), {'cursor': cursor}
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            self.ranked()[2:],
+        )
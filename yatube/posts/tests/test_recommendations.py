@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import follows, recommendations
+from posts.models import Follow, StaleSuggestions, SuggestedAuthor, User
+
+
+class GraphTest(TestCase):
+    def test_csr(self):
+        """Соседи узла — отрезок массива, обратный граф — по возрастанию"""
+        graph = recommendations.Graph.from_sorted(
+            [(0, 2), (0, 3), (2, 1), (3, 0), (3, 1)], 5
+        )
+        self.assertEqual(graph.neighbours(0).tolist(), [2, 3])
+        self.assertEqual(graph.neighbours(1).tolist(), [])
+        self.assertEqual(graph.neighbours(0, limit=1).tolist(), [2])
+        self.assertEqual(graph.neighbours(9).tolist(), [])
+        followers = graph.reversed()
+        self.assertEqual(
+            [followers.neighbours(node).tolist() for node in range(5)],
+            [[3], [2, 3], [0], [0], []],
+        )
+
+
+class SuggestionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {
+            name: User.objects.create(username=name)
+            for name in ('reader', 'twin', 'a', 'b', 'c', 'd', 'e')
+        }
+        follows.follow(
+            (cls.users[user].pk, cls.users[author].pk)
+            for user, author in (
+                ('reader', 'a'), ('reader', 'b'),
+                ('a', 'c'), ('b', 'c'), ('b', 'd'),
+                ('twin', 'a'), ('twin', 'b'), ('twin', 'e'),
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, pairs):
+        by_id = {user.pk: name for name, user in self.users.items()}
+        return [by_id[author_id] for author_id, _ in pairs]
+
+    def test_suggest(self):
+        """Друзья друзей и подписки похожих читателей, без своих подписок"""
+        graph = recommendations.FollowGraph.load()
+        suggestions = graph.suggest(self.users['reader'].pk, 10)
+        # c: двое из подписок; e и d: по одному пути с весом 1
+        self.assertEqual(self.names(suggestions)[0], 'c')
+        self.assertEqual(set(self.names(suggestions)), {'c', 'd', 'e'})
+        self.assertEqual(graph.suggest(self.users['e'].pk, 10), [])
+
+    def test_refresh_and_read(self):
+        """Рекомендации читаются одним запросом, подписки отсеиваются"""
+        recommendations.refresh()
+        reader = self.users['reader']
+        with self.assertNumQueries(1):
+            suggested = [
+                suggestion.author.username
+                for suggestion in recommendations.for_user(reader)
+            ]
+        self.assertEqual(suggested[0], 'c')
+        Follow.objects.create(user=reader, author=self.users['c'])
+        self.assertNotIn(
+            'c',
+            [s.author.username for s in recommendations.for_user(reader)],
+        )
+
+    def test_stale_users(self):
+        """Без --all пересчитываются только читатели с новыми подписками"""
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertFalse(StaleSuggestions.objects.exists())
+        SuggestedAuthor.objects.all().delete()
+        Follow.objects.filter(
+            user=self.users['twin'], author=self.users['e']
+        ).delete()
+        self.assertEqual(
+            list(StaleSuggestions.objects.values_list('user_id', flat=True)),
+            [self.users['twin'].pk],
+        )
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertEqual(
+            set(SuggestedAuthor.objects.values_list('user_id', flat=True)),
+            {self.users['twin'].pk},
+        )
+        self.assertFalse(StaleSuggestions.objects.exists())
+
+    def test_pages(self):
+        """Рекомендации видны на своём профиле и в ленте подписок"""
+        recommendations.refresh()
+        self.client.force_login(self.users['reader'])
+        for url in (
+            reverse('posts:profile', args=['reader']),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Кого почитать')
+        response = self.client.get(reverse('posts:profile', args=['twin']))
+        self.assertNotContains(response, 'Кого почитать')
@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, User
+
+
+@override_settings(POSTS_SEARCH_BACKEND='posts.search.FTS5Backend')
+class PostSearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='author')
+        cls.post = Post.objects.create(
+            text='Ёжик <b>в тумане</b> ищет лошадку',
+            author=cls.user,
+        )
+        for i in range(12):
+            Post.objects.create(
+                text=f'Туман над рекой №{i}', author=cls.user
+            )
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:post_search'), {'q': query, **params}
+        )
+
+    def test_search_finds_and_highlights(self):
+        """Поиск находит пост без учёта «ё» и подсвечивает совпадение"""
+        response = self.search('ежик')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 1)
+        self.assertEqual(page_obj[0], self.post)
+        self.assertIn('<mark>Ежик</mark>', page_obj[0].snippet)
+        self.assertIn('&lt;b&gt;', page_obj[0].snippet)
+
+    def test_search_is_paginated(self):
+        """Выдача разбита на страницы, ссылки сохраняют запрос"""
+        response = self.search('тума')
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?q=%D1%82%D1%83%D0%BC%D0%B0&amp;page=2')
+        response = self.search('тума', page=2)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_fts_syntax_is_not_an_error(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        response = self.search('"туман OR NEAR(* -')
+        self.assertEqual(response.status_code, 200)
+        response = self.search('***')
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.create(text='Кракозябра', author=self.user)
+        self.assertEqual(search.get_backend().ids('кракозябра'), [post.id])
+        post.text = 'Абракадабра'
+        post.save()
+        self.assertEqual(search.get_backend().ids('кракозябра'), [])
+        self.assertEqual(search.get_backend().ids('абракадабра'), [post.id])
+        post.delete()
+        self.assertEqual(search.get_backend().ids('абракадабра'), [])
+
+    def test_filter_uses_subquery(self):
+        """Отбор найденных постов — один запрос, без списка id"""
+        queryset = search.get_backend().filter(
+            Post.objects.filter(author=self.user), 'туман'
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(len(queryset), 13)
+        self.assertIn(f'FROM {search.FTS_TABLE}', str(queryset.query))
+        self.assertFalse(search.get_backend().filter(Post.objects.all(), '*'))
+
+    @override_settings(POSTS_SEARCH_BACKEND='posts.search.SimpleBackend')
+    def test_simple_filter(self):
+        queryset = search.get_backend().filter(Post.objects.all(), 'ежик')
+        self.assertEqual(list(queryset), [])
+        queryset = search.get_backend().filter(Post.objects.all(), 'Ёжик')
+        self.assertEqual(list(queryset), [self.post])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'ежик'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [self.post])
+
+    def test_rebuild_search_index(self):
+        """Команда пересобирает индекс с нуля"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(search.get_backend().ids('ежик'), [])
+        call_command(
+            'rebuild_search_index', batch_size=5, stdout=StringIO()
+        )
+        self.assertEqual(search.get_backend().ids('ежик'), [self.post.id])
+        self.assertEqual(len(search.get_backend().ids('туман')), 13)
@@ -0,0 +1,55 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from posts import seeding
+from posts.models import Comment, Follow, Post, User
+
+
+class SeedingTest(TestCase):
+    SCALE = seeding.Scale(
+        users=30, groups=3, posts=100, comments=150, follows=5
+    )
+
+    def test_generate(self):
+        """Генератор создаёт данные заданного объёма и счётчики"""
+        created = seeding.generate(self.SCALE, seed=1)
+        self.assertEqual(created['users'], 30)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 150)
+        self.assertEqual(Follow.objects.count(), created['follows'])
+        self.assertFalse(
+            Follow.objects.filter(user_id=F('author_id')).exists()
+        )
+        author = User.objects.order_by('-stats__posts_count').first()
+        self.assertEqual(author.stats.posts_count, author.posts.count())
+        # даты постов растут вместе с id
+        dates = list(Post.objects.order_by('id').values_list(
+            'pub_date', flat=True
+        ))
+        self.assertEqual(dates, sorted(dates))
+
+    def test_deterministic(self):
+        """Один seed — одни и те же данные"""
+        seeding.generate(self.SCALE, seed=7, prefix='a')
+        texts = Post.objects.order_by('id').values_list('text', flat=True)
+        first = list(texts)
+        Post.objects.all().delete()
+        seeding.generate(self.SCALE, seed=7, prefix='b')
+        second = list(texts.all())
+        self.assertEqual(first, second)
+
+    def test_images(self):
+        """Заготовленные картинки раздаются части постов"""
+        media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            seeding.generate(self.SCALE, images=3, image_ratio=0.5)
+            with_image = Post.objects.exclude(image='')
+            self.assertTrue(0 < with_image.count() < 100)
+            self.assertTrue(with_image.first().image.storage.exists(
+                with_image.first().image.name
+            ))
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from posts import feed_cache, thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class InlineExecutor:
+    """Пул, который выполняет задачу сразу, без потоков."""
+    def __init__(self):
+        self.jobs = 0
+
+    def submit(self, fn, *args):
+        self.jobs += 1
+        fn(*args)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=True)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800)).save(buffer, 'JPEG')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=User.objects.create(username='author'),
+            image=SimpleUploadedFile('photo.jpg', buffer.getvalue()),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # sorl-thumbnail держит свои записи и в кэше
+        cache.clear()
+        thumbnails._pending.clear()
+
+    def render(self):
+        return Template(
+            '{% load post_thumbnails %}'
+            '{% ready_thumbnail post.image "960x339" crop="center" as im %}'
+            '{{ im.url }}'
+        ).render(Context({'post': self.post}))
+
+    def test_original_until_thumbnail_ready(self):
+        """Пока миниатюры нет, шаблон показывает оригинал"""
+        executor = mock.Mock()
+        with mock.patch.object(
+            thumbnails, '_get_executor', return_value=executor
+        ):
+            self.assertEqual(self.render(), self.post.image.url)
+            self.render()
+        self.assertEqual(executor.submit.call_count, 1)
+
+    def test_thumbnail_served_when_ready(self):
+        """Задача пула режет миниатюру, и шаблон начинает её отдавать"""
+        executor = InlineExecutor()
+        with mock.patch.object(
+            thumbnails, '_get_executor', return_value=executor
+        ):
+            self.render()
+            url = self.render()
+        self.assertEqual(executor.jobs, 1)
+        self.assertNotEqual(url, self.post.image.url)
+        self.assertTrue(url.startswith(settings.MEDIA_URL + 'cache/'))
+
+    def test_job_refreshes_post_feeds(self):
+        """Задача сдвигает поколения ленты поста, не ища пост в базе"""
+        before = feed_cache.generation(feed_cache.post_page(self.post.pk))
+        with mock.patch.object(
+            thumbnails, '_get_executor', return_value=InlineExecutor()
+        ), CaptureQueriesContext(connection) as queries:
+            self.render()
+        self.assertFalse([
+            query for query in queries.captured_queries
+            if 'posts_post' in query['sql']
+        ])
+        self.assertGreater(
+            feed_cache.generation(feed_cache.post_page(self.post.pk)), before
+        )
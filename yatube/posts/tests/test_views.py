@@ -2,19 +2,27 @@ import shutil
 import tempfile
 from django.conf import settings
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from posts.models import Post, Group
+from posts.models import Post, Group, Follow, FeedEntry, Comment
+from posts.tests.utils import OnCommitMixin, QueryCountMixin
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.utils import timezone
+from core.cache import stampede
+from posts import feed, feed_cache
+from posts.conditional import page_key
+from posts.paginator import CursorPaginator
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=False)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -234,7 +242,65 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']), 3)
 
 
-class CacheIndexPageTest(TestCase):
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(
+            username='posts_author',
+        )
+        for i in range(13):
+            Post.objects.create(
+                text='Пост №' + str(i),
+                author=cls.user,
+            )
+        # одинаковое время публикации: порядок держится на id
+        Post.objects.filter(id__lte=6).update(pub_date=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Курсоры ведут вперёд и назад без пропусков и повторов"""
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        response = self.client.get(reverse('posts:index'))
+        first_page = response.context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        self.assertEqual([post.id for post in first_page], expected[:10])
+
+        response = self.client.get(
+            reverse('posts:index') + '?cursor=' + first_page.next_cursor
+        )
+        second_page = response.context['page_obj']
+        self.assertIsNone(second_page.next_cursor)
+        self.assertEqual([post.id for post in second_page], expected[10:])
+
+        response = self.client.get(
+            reverse('posts:index')
+            + '?cursor=' + second_page.previous_cursor
+        )
+        page = response.context['page_obj']
+        self.assertEqual([post.id for post in page], expected[:10])
+        self.assertIsNone(page.previous_cursor)
+
+    def test_cursor_page_single_query(self):
+        """Страница по курсору не делает COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.cursor_page().next_cursor
+        with self.assertNumQueries(1):
+            paginator.cursor_page(cursor)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class CacheIndexPageTest(OnCommitMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -247,17 +313,59 @@ class CacheIndexPageTest(TestCase):
         self.authorized_client.force_login(self.user)
 
     def test_cache(self):
-        content = self.authorized_client.get(reverse('posts:index')).content
-        Post.objects.create(
+        """Лента берётся из кэша, пока посты меняются в обход сигналов"""
+        post = Post.objects.create(
             text='Пост №1',
             author=self.user,
         )
+        content = self.authorized_client.get(reverse('posts:index')).content
+        Post.objects.filter(pk=post.pk).update(text='Пост №2')
         content_1 = self.authorized_client.get(reverse('posts:index')).content
         self.assertEqual(content, content_1)
         cache.clear()
         content_2 = self.authorized_client.get(reverse('posts:index')).content
         self.assertNotEqual(content_1, content_2)
 
+    def test_cache_invalidated_by_post_changes(self):
+        """Создание, правка и удаление поста сразу видны в лентах"""
+        group = Group.objects.create(
+            title='group', slug='group', description='-'
+        )
+        other_group = Group.objects.create(
+            title='other', slug='other', description='-'
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:group_list', args=[group.slug]),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(
+                text='Новый пост', author=self.user, group=group
+            )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Новый пост')
+
+        post.text = 'Исправленный пост'
+        post.group = other_group
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        response = self.authorized_client.get(urls[0])
+        self.assertContains(response, 'Исправленный пост')
+        response = self.authorized_client.get(urls[2])
+        self.assertNotContains(response, 'Исправленный пост')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, 'Исправленный пост')
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -344,3 +452,356 @@ class FollowViewsTest(TestCase):
         )
         post_object = response.context['page_obj']
         self.assertEqual((len(post_object)), 0)
+
+
+@override_settings(FOLLOW_FEED_STRATEGY='write')
+class MaterializedFollowFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(
+            username='posts_author',
+        )
+        cls.follower = User.objects.create(
+            username='follower',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Старый пост',
+        )
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def get_feed(self):
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты, отписка их убирает"""
+        self.follower_client.get(
+            reverse('posts:profile_follow', args=[self.author])
+        )
+        self.assertEqual(self.get_feed(), ['Старый пост'])
+        self.follower_client.get(
+            reverse('posts:profile_unfollow', args=[self.author])
+        )
+        self.assertEqual(self.get_feed(), [])
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_new_post_fans_out(self):
+        """Новый пост сразу раскладывается в ленты подписчиков"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+        self.assertEqual(self.get_feed(), ['Новый пост', 'Старый пост'])
+
+    @override_settings(FOLLOW_FEED_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярного автора не раскладываются, но видны в ленте"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.get_feed(), ['Новый пост', 'Старый пост'])
+
+    @override_settings(
+        FOLLOW_FEED_CELEBRITY_FOLLOWERS=1, FOLLOW_FEED_BACKFILL=1,
+        PAGINATOR_PAGES=2,
+    )
+    def test_celebrity_feed_is_read_without_writes(self):
+        """Лента с популярным автором читается целиком и ничего не пишет"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        for number in range(3):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        entries = FeedEntry.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.follower_client.get(
+                reverse('posts:follow_index')
+            )
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and 'posts_' in query['sql']
+        ])
+        self.assertEqual(FeedEntry.objects.count(), entries)
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            [post.text for post in page_obj], ['Пост 2', 'Пост 1']
+        )
+        response = self.follower_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': page_obj.next_cursor},
+        )
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост 0', 'Старый пост'],
+        )
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='commentator')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+        cls.expected = list(
+            cls.post.comments.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page(self):
+        """Под постом только новые комментарии, всего — из счётчика"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.id for comment in comments], self.expected[:5]
+        )
+        self.assertContains(response, 'Комментариев: 7')
+        self.assertContains(
+            response,
+            reverse('posts:post_comments', args=[self.post.id])
+            + '?cursor=' + comments.next_cursor,
+        )
+
+    def test_next_batch(self):
+        """Фрагмент по курсору отдаёт следующую порцию"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id])
+        )
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id]),
+            {'cursor': cursor},
+        )
+        comments = response.context['comments']
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        self.assertEqual(
+            [comment.id for comment in comments], self.expected[5:]
+        )
+        self.assertIsNone(comments.next_cursor)
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id + 1])
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountViewsTest(QueryCountMixin, TestCase):
+    """Число запросов страницы не зависит от числа постов на ней"""
+    ROWS = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create(username='reader')
+        cls.authors = []
+        for i in range(cls.ROWS):
+            author = User.objects.create(
+                username=f'author_{i}', first_name='Имя', last_name=str(i)
+            )
+            group = Group.objects.create(
+                title=f'group_{i}', slug=f'group_{i}', description='-'
+            )
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.authors.append(author)
+        cls.post = Post.objects.create(
+            text='Пост с комментариями',
+            author=cls.authors[0],
+            group=group,
+        )
+        for author in cls.authors:
+            Post.objects.create(text='Ещё пост', author=cls.authors[0])
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_list_pages(self):
+        pages = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', args=['group_0']): 2,
+            reverse('posts:profile', args=['author_0']): 2,
+            reverse('posts:post_detail', args=[self.post.id]): 2,
+            reverse('posts:post_comments', args=[self.post.id]): 2,
+        }
+        for url, limit in pages.items():
+            with self.subTest(url=url):
+                with self.assertMaxQueries(limit):
+                    self.client.get(url)
+
+    def test_follow_index(self):
+        # лента и «Кого почитать» — по одному запросу
+        with self.assertMaxQueries(4):
+            self.reader_client.get(reverse('posts:follow_index'))
+
+    @override_settings(FOLLOW_FEED_STRATEGY='write')
+    def test_materialized_follow_index(self):
+        feed.rebuild()
+        with self.assertMaxQueries(5):
+            response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class ConditionalViewsTest(OnCommitMixin, QueryCountMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertNotModified(self, client, url):
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_not_modified_until_change(self):
+        """Страница отдаёт 304, пока не поменялись её данные"""
+        changes = {
+            reverse('posts:index'): lambda: Post.objects.create(
+                text='Новый', author=self.author
+            ),
+            reverse('posts:group_list', args=[self.group.slug]): (
+                lambda: Post.objects.create(
+                    text='Новый', author=self.author, group=self.group
+                )
+            ),
+            reverse('posts:profile', args=[self.author.username]): (
+                lambda: Follow.objects.create(
+                    user=User.objects.create(username='fan'),
+                    author=self.author,
+                )
+            ),
+            reverse('posts:post_detail', args=[self.post.id]): (
+                lambda: Comment.objects.create(
+                    post=self.post, author=self.reader, text='Коммент'
+                )
+            ),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                etag = self.assertNotModified(self.client, url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_generation_bumped_on_commit(self):
+        """Поколение ленты сдвигается только после фиксации"""
+        before = feed_cache.generation(feed_cache.INDEX)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Post.objects.create(text='Новый', author=self.author)
+            self.assertEqual(feed_cache.generation(feed_cache.INDEX), before)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(feed_cache.generation(feed_cache.INDEX), before)
+
+    def test_not_modified_without_rendering(self):
+        """Ответ 304 не собирает страницу"""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        with self.assertMaxQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_cache_control(self):
+        """Анонимные страницы общие, страницы пользователя — личные"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        reader_response = self.reader_client.get(url)
+        self.assertIn('private', reader_response['Cache-Control'])
+        self.assertNotEqual(reader_response['ETag'], response['ETag'])
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=reader_response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ANONYMOUS_PAGE_CACHE=True)
+class AnonymousPageCacheTest(OnCommitMixin, QueryCountMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_served_from_cache(self):
+        """Повторный анонимный запрос не трогает базу"""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        with self.assertMaxQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached['ETag'], response['ETag'])
+
+    def test_invalidated_by_changes(self):
+        """Правка данных сразу видна и в закэшированной странице"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+        )
+        for url in urls:
+            self.client.get(url)
+        self.post.text = 'Исправленный пост'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Исправленный')
+
+    def test_stale_page_while_rebuilding(self):
+        """Пока страницу пересобирает другой запрос, отдаётся старая"""
+        url = reverse('posts:index')
+        old = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(text='Новый пост', author=self.author)
+        cache.add(stampede.LOCK_KEY.format(page_key(url)), True)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Новый пост')
+        self.assertEqual(response['ETag'], old['ETag'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_authorized_not_cached(self):
+        """Страницы вошедших пользователей не кэшируются целиком"""
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:index')
+        client.get(url)
+        self.assertIsNone(cache.get(page_key(url)))
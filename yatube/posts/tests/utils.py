@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """Проверки числа SQL-запросов для TestCase."""
+
+    @contextmanager
+    def assertMaxQueries(self, limit):
+        """Не больше ``limit`` запросов внутри блока, сколько бы ни было
+        строк на странице."""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        self.assertLessEqual(
+            executed, limit,
+            f'{executed} запросов вместо не более {limit}:\n'
+            + '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+
+
+class OnCommitMixin:
+    """Колбэки ``transaction.on_commit`` в TestCase.
+
+    TestCase не фиксирует транзакцию, и колбэки не вызываются.
+    Повторяет ``captureOnCommitCallbacks`` из Django 3.2.
+    """
+
+    @contextmanager
+    def captureOnCommitCallbacks(self, *, using=DEFAULT_DB_ALIAS,
+                                 execute=False):
+        """Собирает колбэки блока; с ``execute`` вызывает их, как
+        после фиксации."""
+        callbacks = []
+        start = len(connections[using].run_on_commit)
+        try:
+            yield callbacks
+        finally:
+            callbacks[:] = [
+                func for _, func in connections[using].run_on_commit[start:]
+            ]
+            if execute:
+                for callback in callbacks:
+                    callback()
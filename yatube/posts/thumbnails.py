@@ -0,0 +1,152 @@
+"""Фоновая нарезка миниатюр картинок постов.
+
+Шаблоны не режут картинки сами: тег ``ready_thumbnail`` отдаёт
+готовую миниатюру из key-value хранилища sorl-thumbnail, а если её
+ещё нет — ставит задачу в пул воркеров и показывает оригинал.
+Размеры, которые режутся сразу после публикации, перечислены
+в настройке ``POST_THUMBNAILS``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import feed_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    def _with_defaults(self, source, options):
+        """Опции так же, как их дополняет ``get_thumbnail``."""
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра или ``None``; картинку не открывает."""
+        source = ImageFile(file_)
+        options = self._with_defaults(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = ThumbnailBackend()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def _job_key(name, geometry, options):
+    return (name, geometry, tuple(sorted(options.items())))
+
+
+def generate(name, sizes=None):
+    """Режет миниатюры картинки ``name`` синхронно."""
+    for geometry, options in sizes or settings.POST_THUMBNAILS:
+        backend.get_thumbnail(name, geometry, **options)
+
+
+def _post_feeds(post):
+    """Ленты, закэшированные с оригиналом картинки поста."""
+    if post is None or post.pk is None:
+        return ()
+    return (
+        feed_cache.post_page(post.pk),
+        *feed_cache.post_feeds(post.author_id, post.group_id),
+    )
+
+
+def _run(name, geometry, options, feeds):
+    try:
+        generate(name, [(geometry, options)])
+        # после нарезки страницы должны показать миниатюру
+        if feeds:
+            feed_cache.bump(*feeds)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюру %s', name)
+    finally:
+        with _lock:
+            _pending.discard(_job_key(name, geometry, options))
+        connections.close_all()
+
+
+def enqueue(name, sizes=None, feeds=()):
+    """Ставит нарезку миниатюр в очередь пула воркеров.
+
+    ``feeds`` — поколения лент, которые сдвигаются после нарезки.
+    """
+    if not name:
+        return
+    sizes = sizes or settings.POST_THUMBNAILS
+    if not settings.THUMBNAIL_ASYNC:
+        generate(name, sizes)
+        return
+    for geometry, options in sizes:
+        key = _job_key(name, geometry, options)
+        with _lock:
+            if key in _pending:
+                continue
+            _pending.add(key)
+        _get_executor().submit(_run, name, geometry, options, feeds)
+
+
+def enqueue_post(post):
+    """Нарезка миниатюр поста после фиксации транзакции."""
+    if post.image:
+        name, feeds = post.image.name, _post_feeds(post)
+        transaction.on_commit(lambda: enqueue(name, feeds=feeds))
+
+
+def ready_or_enqueue(image, geometry, **options):
+    """Готовая миниатюра; если её нет — задача в очередь и ``None``."""
+    if not image:
+        return None
+    if not settings.THUMBNAIL_ASYNC:
+        return backend.get_thumbnail(image, geometry, **options)
+    thumbnail = backend.get_ready_thumbnail(image, geometry, **options)
+    if thumbnail is None:
+        enqueue(
+            image.name, [(geometry, options)],
+            _post_feeds(getattr(image, 'instance', None)),
+        )
+    return thumbnail
+
+
+def generate_many(names):
+    """Режет миниатюры пачки картинок; для процессов pregenerate."""
+    done = 0
+    for name in names:
+        try:
+            generate(name)
+            done += 1
+        except Exception:
+            logger.exception('Не удалось нарезать миниатюру %s', name)
+    connections.close_all()
+    return done
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -9,10 +9,19 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
+    path('search/', views.post_search, name='post_search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment', views.add_comment, name='add_comment'),
+    path('trending/', views.trending, name='trending'),
+    path('group/', views.group_index, name='group_index'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/many/', views.follow_many, name='follow_many'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -23,4 +32,19 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path(
+        'api/follow/authors/',
+        api.follow_authors,
+        name='api_follow_authors'
+    ),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_post_comments'
+    ),
 ]
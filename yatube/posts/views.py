@@ -1,67 +1,195 @@
+from django.conf import settings
+from django.core.paginator import Paginator
 from django.forms.utils import to_current_timezone
+from django.utils.http import urlencode
+from django.db import transaction
+from django.http import HttpResponseBadRequest
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, get_object_or_404, redirect
-from yatube.settings import PAGINATOR_PAGES
-from posts.models import Post, Group, User, Follow
+from posts.models import COMMENT_ORDERING, Comment, Post, Group, User, Follow
 from posts.forms import PostForm, CommentForm
-from django.core.paginator import Paginator
+from posts import (
+    feed, feed_cache, follows, ranking, recommendations, search, thumbnails,
+)
+from posts.conditional import conditional, page_conditional
+from posts.counters import stats_for
+from posts.paginator import CursorPaginator, get_page
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from core.db.routers import replica_reads
+
+
+def _group(request, slug):
+    # объекты страницы нужны и для ETag, и для самой страницы
+    if not hasattr(request, '_group'):
+        request._group = get_object_or_404(Group, slug=slug)
+    return request._group
+
+
+def _author(request, username):
+    if not hasattr(request, '_author'):
+        request._author = get_object_or_404(
+            User.objects.select_related('stats'), username=username
+        )
+    return request._author
+
+
+def _post(request, post_id):
+    if not hasattr(request, '_post'):
+        request._post = get_object_or_404(
+            Post.objects.for_detail().select_related('author__stats'),
+            id=post_id,
+        )
+    return request._post
+
+
+def _comments_page(request, post_id):
+    """Порция комментариев: новые сверху, дальше — по ``?cursor=``."""
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).for_post(),
+        settings.COMMENTS_PER_PAGE, ordering=COMMENT_ORDERING,
+    ).cursor_page(request.GET.get('cursor'))
+
 
+def _first_page(request):
+    """Запрошена первая страница ленты без номера и курсора."""
+    return settings.PAGINATOR_CURSOR and not (
+        request.GET.get('page') or request.GET.get('cursor')
+    )
+
+
+def profile_generation(request, username):
+    author = _author(request, username)
+    feeds = [feed_cache.author_feed(author.id),
+             feed_cache.profile_page(author.id)]
+    if request.user.is_authenticated:
+        # кнопка «Подписаться/Отписаться» зависит от подписок читателя
+        feeds.append(feed_cache.follow_feed(request.user.id))
+    if request.user == author:
+        feeds.append(feed_cache.SUGGESTIONS)
+    return feed_cache.latest_generation(*feeds)
+
+
+def post_generation(request, post_id):
+    post = _post(request, post_id)
+    return feed_cache.latest_generation(
+        feed_cache.post_page(post.id),
+        # на странице поста есть число постов автора
+        feed_cache.author_feed(post.author_id),
+    )
 
+
+@replica_reads
+@page_conditional(lambda request: feed_cache.generation(feed_cache.INDEX))
 def index(request):
 
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PAGINATOR_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page_obj = get_page(request, post_list)
     title = 'Последние обновления на сайте'
     context = {
         'page_obj': page_obj,
         'title': title,
+        **feed_cache.context(feed_cache.INDEX, page_obj),
     }
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@page_conditional(lambda request: feed_cache.latest_generation(
+    # на странице тексты постов, их правка сдвигает поколение главной
+    feed_cache.TRENDING, feed_cache.INDEX
+))
+def trending(request):
+    page_obj = get_page(
+        request, ranking.posts(), ordering=('-score', '-post_id')
+    )
+    page_obj.object_list = [entry.post for entry in page_obj]
+    context = {
+        'page_obj': page_obj,
+        'title': 'Популярное',
+        'groups': ranking.groups()[:settings.TRENDING_GROUPS_SHOWN],
+        'trending': True,
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@replica_reads
+@page_conditional(lambda request, slug: feed_cache.generation(
+    feed_cache.group_feed(_group(request, slug).id)
+))
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    group = _group(request, slug)
+    posts = group.posts.for_feed()
     title = f'Записи сообщества - {str(group)}'
-    paginator = Paginator(posts, PAGINATOR_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if _first_page(request):
+        page_obj = feed_cache.first_page(
+            feed_cache.group_feed(group.id), posts
+        )
+    else:
+        page_obj = get_page(request, posts)
     context = {
         'page_obj': page_obj,
         'group': group,
         'title': title,
         'posts': posts,
+        **feed_cache.context(feed_cache.group_feed(group.id), page_obj),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@page_conditional(
+    lambda request: feed_cache.generation(feed_cache.GROUPS)
+)
+def group_index(request):
+    """Каталог групп: счётчики и последний пост — одним запросом."""
+    groups = Group.objects.select_related(
+        'stats__last_post__author'
+    ).only(
+        'title', 'slug', 'description',
+        'stats__posts_count', 'stats__last_activity',
+        'stats__last_post__text', 'stats__last_post__pub_date',
+        'stats__last_post__author__username',
+    )
+    context = {
+        'page_obj': get_page(request, groups, ordering=('title', 'id')),
+        'title': 'Группы',
+    }
+    return render(request, 'posts/group_index.html', context)
+
+
+@replica_reads
+@page_conditional(profile_generation)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_count = post_list.count()
-    paginator = Paginator(post_list, PAGINATOR_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = _author(request, username)
+    stats = stats_for(author)
+    post_list = author.posts.for_feed()
+    page_obj = get_page(request, post_list)
     following = False
     if request.user.is_authenticated:
         following = Follow.objects.filter(user=request.user,
                                           author=author).exists()
     context = {
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'author': author,
         'following': following,
+        # «Кого почитать» — только на своём профиле
+        'suggestions': (
+            recommendations.for_user(author)
+            if request.user == author else ()
+        ),
+        **feed_cache.context(feed_cache.author_feed(author.id), page_obj),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@page_conditional(post_generation)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    comments = post.comments.all()
-    posts_count = post.author.posts.count()
+    post = _post(request, post_id)
+    posts_count = stats_for(post.author).posts_count
 
     context = {
         'post': post,
@@ -69,13 +197,46 @@ def post_detail(request, post_id):
         'group': post.group,
         'posts_count': posts_count,
         'form': CommentForm(),
-        'comments': comments,
+        # всего комментариев — из счётчика post.comments_count
+        'comments': _comments_page(request, post.id),
+        'post_id': post.id,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+@conditional(lambda request, post_id: feed_cache.generation(
+    feed_cache.post_page(post_id)
+))
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для подгрузки."""
+    get_object_or_404(Post.objects.values_list('id'), id=post_id)
+    context = {
+        'comments': _comments_page(request, post_id),
+        'post_id': post_id,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        results = search.get_backend().search(query)
+        page_obj = Paginator(results, settings.PAGINATOR_PAGES).get_page(
+            request.GET.get('page')
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'pagination_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @csrf_exempt
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -90,11 +251,13 @@ def post_create(request):
     post.author = request.user
     post.pub_date = to_current_timezone
     post.save()
+    thumbnails.enqueue_post(post)
     return redirect('posts:profile', username=post.author)
 
 
 @csrf_exempt
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = PostForm(
@@ -116,10 +279,12 @@ def post_edit(request, post_id):
     form = form.save(False)
     form.author = request.user
     form.save()
+    thumbnails.enqueue_post(form)
     return redirect('posts:post_detail', post_id)
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -133,21 +298,24 @@ def add_comment(request, post_id):
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
-    paginator = Paginator(post_list, PAGINATOR_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if feed.is_materialized():
+        entries, ordering = feed.entries_for(request.user)
+        page_obj = get_page(request, entries, ordering=ordering)
+        page_obj.object_list = [feed.as_post(entry) for entry in page_obj]
+    else:
+        page_obj = get_page(request, feed.posts_for(request.user))
     context = {
         'page_obj': page_obj,
+        'suggestions': recommendations.for_user(request.user),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 @csrf_exempt
+@transaction.atomic
 def profile_follow(request, username):
     if request.user.username == username:
         return redirect('posts:profile', username=username)
@@ -158,9 +326,26 @@ def profile_follow(request, username):
 
 @login_required
 @csrf_exempt
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follower = Follow.objects.filter(user=request.user, author=author)
     if follower.exists():
         follower.delete()
     return redirect('posts:profile', username=username)
+
+
+@login_required
+@require_POST
+def follow_many(request):
+    """Подписка сразу на много авторов: поле ``authors`` — список имён."""
+    usernames = follows.parse_usernames(request.POST.getlist('authors'))
+    if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+        return HttpResponseBadRequest(
+            f'Не больше {settings.FOLLOW_BULK_LIMIT} авторов за раз'
+        )
+    authors = follows.resolve(usernames)
+    follows.follow(
+        (request.user.pk, author_id) for author_id in authors.values()
+    )
+    return redirect('posts:follow_index')
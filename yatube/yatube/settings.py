@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +26,10 @@ SECRET_KEY = 'vwe*az=p+(xc6o649t1y@lq%9n95ahnos_5s31ms89_bxj3_9m'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# Запуск тестов (manage.py test или pytest): ниже по нему выбираются
+# настройки, которые не должны переживать процесс тестов
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -49,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerfStatsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,12 +91,80 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+# DATABASE_BACKEND: sqlite — файл DATABASE_NAME рядом с проектом,
+# postgresql и mysql — сервер из DATABASE_HOST, DATABASE_PORT,
+# DATABASE_USER, DATABASE_PASSWORD
+DATABASE_BACKEND = os.environ.get('DATABASE_BACKEND', 'sqlite')
+DATABASE_ENGINES = {
+    'sqlite': 'core.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+    'mysql': 'django.db.backends.mysql',
 }
+# Соединение живёт дольше запроса и переиспользуется потоком воркера
+# (в Django 2.2 это и есть пул); 0 — закрывать после каждого запроса
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+if DATABASE_BACKEND == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINES['sqlite'],
+            'NAME': os.environ.get(
+                'DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'OPTIONS': {
+                # писатели ждут друг друга, а не падают с
+                # «database is locked»; читатели не ждут писателей
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout={};'
+                    'PRAGMA mmap_size={};'
+                ).format(
+                    int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+                    int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 ** 2)),
+                ),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DATABASE_ENGINES[DATABASE_BACKEND],
+            'NAME': os.environ.get('DATABASE_NAME', 'yatube'),
+            'USER': os.environ.get('DATABASE_USER', 'yatube'),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            # за пулом соединений (PgBouncer в режиме transaction)
+            # серверные курсоры iterator() не переживают смену соединения
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.environ.get('DATABASE_POOLER') == '1'
+            ),
+        }
+    }
+
+
+# Реплики только для чтения: DATABASE_REPLICAS — через запятую файлы
+# SQLite (их обновляет manage.py sync_replica) или хосты серверов.
+# Из реплик читают ленты и посты; браузер, который только что писал,
+# REPLICA_PIN_SECONDS секунд читает из основной базы
+DATABASE_REPLICAS = []
+for number, location in enumerate(filter(None, os.environ.get(
+    'DATABASE_REPLICAS', ''
+).split(',')), start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME' if DATABASE_BACKEND == 'sqlite' else 'HOST': location,
+        # в тестах реплика — та же тестовая база
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
 
 
 # Password validation
@@ -141,15 +216,147 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 PAGINATOR_PAGES = 10
+# Комментарии под постом показываются порциями, остальные подгружаются
+COMMENTS_PER_PAGE = 20
+# Ленты листаются курсором (?cursor=), ссылки ?page=N тоже работают
+PAGINATOR_CURSOR = True
+# Наибольший ?limit= у страниц JSON API
+API_MAX_PAGE_SIZE = 100
+
+# Лента подписок: 'read' — собирается при чтении,
+# 'write' — раскладывается по подписчикам при публикации
+FOLLOW_FEED_STRATEGY = os.environ.get('FOLLOW_FEED_STRATEGY', 'read')
+# Посты авторов с таким числом подписчиков читаются при чтении
+FOLLOW_FEED_CELEBRITY_FOLLOWERS = 1000
+# Сколько последних постов автора попадает в ленту после подписки
+FOLLOW_FEED_BACKFILL = 1000
+# Сколько авторов можно передать в одну массовую подписку
+FOLLOW_BULK_LIMIT = 1000
+
+# Рекомендации «Кого почитать» (refresh_suggestions): сколько хранить
+# на читателя и сколько показывать на странице
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+# Сколько соседей узла графа подписок учитывать при расчёте
+SUGGESTIONS_FANOUT = 100
+# Сколько самых похожих читателей подсказывают авторов
+SUGGESTIONS_SIMILAR_READERS = 20
+
+# «Популярное» (update_trending): веса событий, затухающие вдвое
+# за TRENDING_HALF_LIFE секунд
+TRENDING_WEIGHTS = {'post': 1.0, 'comment': 1.0, 'follow': 2.0}
+TRENDING_HALF_LIFE = 12 * 60 * 60
+# Записи с затухшей ниже этого оценкой удаляются
+TRENDING_MIN_SCORE = 0.05
+TRENDING_GROUPS_SHOWN = 10
+
+# Поиск по постам: обратный индекс SQLite FTS5;
+# для других баз и SQLite без FTS5 — 'posts.search.SimpleBackend'
+POSTS_SEARCH_BACKEND = os.environ.get(
+    'POSTS_SEARCH_BACKEND',
+    'posts.search.FTS5Backend' if DATABASE_BACKEND == 'sqlite'
+    else 'posts.search.SimpleBackend',
+)
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Миниатюры картинок постов режутся в фоне, а не в шаблоне
+# (в тестах по умолчанию сразу: фоновые потоки пишут во временный
+# MEDIA_ROOT, который тест уже удалил)
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': False}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+THUMBNAIL_ASYNC = os.environ.get(
+    'THUMBNAIL_ASYNC', '0' if TESTING else '1'
+) == '1'
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+
+# Загруженные картинки: больше IMAGE_MAX_PIXELS точек отклоняются,
+# крупнее IMAGE_MAX_SIZE уменьшаются, с EXIF или тяжелее
+# IMAGE_REENCODE_BYTES пережимаются без метаданных
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+IMAGE_MAX_SIZE = (1920, 1920)
+IMAGE_REENCODE_BYTES = 512 * 1024
+IMAGE_JPEG_QUALITY = 85
+# Сохранять ли исходный файл в media/posts/originals/
+IMAGE_KEEP_ORIGINAL = False
+
 # Подключаем Кэш
+# CACHE_BACKEND: file — общий для всех воркеров каталог на диске,
+# memcached — сервер по сокету, locmem — память процесса (по умолчанию
+# в тестах, чтобы они не видели кэш прошлых запусков)
+CACHE_BACKENDS = {
+    'file': (
+        'core.cache.backends.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'memcached': (
+        'core.cache.backends.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+    'locmem': (
+        'core.cache.backends.LocMemCache',
+        'yatube',
+    ),
+}
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'locmem' if TESTING else 'file'
+)
+# Сколько записей держат file и locmem, пока не начнут вытеснять треть
+# (memcached вытесняет сам). Файловый кэш перед каждой записью читает
+# каталог целиком, поэтому держим его небольшим. Поколения лент
+# файловый кэш хранит отдельно от вытесняемых записей, а locmem
+# вытесняет давно не читанные, так что горячие поколения не теряются
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2000))
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', CACHE_BACKENDS[CACHE_BACKEND][1]
+        ),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(os.environ.get('CACHE_VERSION', 1)),
     }
 }
+if CACHE_BACKEND != 'memcached':
+    # клиенту memcached OPTIONS передаются как аргументы конструктора
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': CACHE_MAX_ENTRIES}
+if CACHE_BACKEND == 'file':
+    # ключи posts.feed_cache.GENERATION_KEY и core.db.routers.SYNCED_KEY
+    CACHES['default']['OPTIONS']['PINNED_PREFIXES'] = [
+        'feed-generation:', 'replica-synced:',
+    ]
+
+# Страницы лент сбрасываются сигналами, поэтому TTL может быть большим
+FEED_CACHE_TTL = 60 * 60
+# Защита кэша от одновременного пересчёта (core.cache.stampede):
+# сколько секунд после срока отдавать устаревшее значение, пока его
+# пересчитывает один запрос; сколько держать блокировку пересчёта;
+# насколько рано пересчитывать заранее (XFetch, 0 — не пересчитывать)
+STAMPEDE_STALE = 60
+STAMPEDE_LOCK = 30
+STAMPEDE_BETA = 1.0
+# Сколько секунд обратный прокси может отдавать анонимам
+# закэшированные HTML-страницы лент, не спрашивая сайт
+HTML_SHARED_MAX_AGE = int(os.environ.get('HTML_SHARED_MAX_AGE', 60))
+# Целые страницы лент и постов для анонимов в кэше сайта; сбрасываются
+# теми же поколениями лент. Устаревшую страницу пересобирает один
+# запрос, остальные ещё ANONYMOUS_PAGE_CACHE_STALE секунд отдают старую
+ANONYMOUS_PAGE_CACHE = os.environ.get('ANONYMOUS_PAGE_CACHE', '0') == '1'
+ANONYMOUS_PAGE_CACHE_TTL = 10 * 60
+ANONYMOUS_PAGE_CACHE_STALE = 60
+
+# Статистика производительности по view (manage.py perfstats);
+# выключенная middleware не участвует в обработке запросов
+PERFSTATS_ENABLED = os.environ.get('PERFSTATS', '0') == '1'
+PERFSTATS_FILE = os.environ.get(
+    'PERFSTATS_FILE', os.path.join(BASE_DIR, 'perfstats.json')
+)
+# Как часто процесс сливает накопленное в файл, секунд
+PERFSTATS_FLUSH_INTERVAL = 10
+# Заголовок Server-Timing с замерами в каждом ответе
+PERFSTATS_SERVER_TIMING = os.environ.get('PERFSTATS_SERVER_TIMING') == '1'